@@ -55,8 +55,7 @@ CREATE TABLE Patients (
     Weight DECIMAL(5,2),
     Allergies VARCHAR(250),
     Address VARCHAR(250) NOT NULL,
-    Insurance_Provider VARCHAR(20),
-    Unique(Patient_First_Name, Patient_Last_Name)
+    Insurance_Provider VARCHAR(20)
 );
 
 
@@ -67,12 +66,14 @@ CREATE TABLE Doctors (
     Doctor_Department VARCHAR(25) NOT NULL
 );
 
+-- Visits are range-partitioned by month on Visit_Date, so the primary key carries the date too
+
 CREATE TABLE Visits (							
-    Visit_ID SERIAL PRIMARY KEY,
+    Visit_ID SERIAL,
     Patient_ID INT,
     Record_ID SERIAL,     --- change
     Admission_Type VARCHAR(10),
-    Visit_Date DATE,
+    Visit_Date DATE NOT NULL,
     Room_Number VARCHAR(10),
     Doctor_ID INT,
     Symptoms VARCHAR(100),
@@ -82,16 +83,113 @@ CREATE TABLE Visits (
     Payment_Amount DECIMAL(10,2),
     Payment_Method VARCHAR(20),
     Payment_Invoice_Number VARCHAR(50),
+    PRIMARY KEY (Visit_ID, Visit_Date),
     FOREIGN KEY (Patient_ID) REFERENCES Patients(Patient_ID),
     FOREIGN KEY (Doctor_ID) REFERENCES Doctors(Doctor_ID)
-);
+) PARTITION BY RANGE (Visit_Date);
+
+CREATE TABLE Visits_Default PARTITION OF Visits DEFAULT;
+
+CREATE INDEX idx_visits_record_id ON Visits (Record_ID);
+
+-- Creates any missing monthly partitions covering p_from through p_to.
+-- Rows of that month already sitting in Visits_Default (and the room stays that
+-- reference them) are set aside, the partition is created and the rows go back in
+-- through Visits. Generated columns are left out of the copy and recomputed on the
+-- way back in. A month that races a concurrent insert is skipped with a warning so
+-- the remaining months, and later runs, still go through; any other error is raised.
+CREATE OR REPLACE FUNCTION create_visit_partitions(p_from DATE, p_to DATE)
+RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    month_start DATE := date_trunc('month', p_from)::DATE;
+    month_end DATE;
+    part_name TEXT;
+    stored_columns TEXT;
+    created INT := 0;
+BEGIN
+    SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO stored_columns
+    FROM pg_attribute
+    WHERE attrelid = 'visits'::regclass AND attnum > 0 AND NOT attisdropped AND attgenerated = '';
+
+    WHILE month_start <= p_to LOOP
+        month_end := (month_start + INTERVAL '1 month')::DATE;
+        part_name := 'visits_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(part_name) IS NULL THEN
+            BEGIN
+                IF EXISTS (SELECT 1 FROM Visits_Default
+                           WHERE Visit_Date >= month_start AND Visit_Date < month_end) THEN
+                    -- The rows stay visits, so keep the stats trigger out of the move
+                    PERFORM set_config('app.archiving', 'on', true);
+                    CREATE TEMP TABLE Visits_Moving (LIKE Visits);
+                    CREATE TEMP TABLE Room_Stays_Moving (Stay_ID INT, Room_Number VARCHAR(10), Visit_ID INT,
+                                                         Visit_Date DATE, Stay_Period DATERANGE);
+                    -- Room_Stays is created further down, so it does not exist during the initial load
+                    IF to_regclass('room_stays') IS NOT NULL THEN
+                        EXECUTE format('WITH moved AS (DELETE FROM Room_Stays
+                                                       WHERE Visit_Date >= %L AND Visit_Date < %L
+                                                       RETURNING Stay_ID, Room_Number, Visit_ID, Visit_Date, Stay_Period)
+                                        INSERT INTO Room_Stays_Moving SELECT * FROM moved',
+                                       month_start, month_end);
+                    END IF;
+                    EXECUTE format('WITH moved AS (DELETE FROM Visits_Default
+                                                   WHERE Visit_Date >= %L AND Visit_Date < %L
+                                                   RETURNING %s)
+                                    INSERT INTO Visits_Moving (%s) SELECT %s FROM moved',
+                                   month_start, month_end, stored_columns, stored_columns, stored_columns);
+                    EXECUTE format('CREATE TABLE %I PARTITION OF Visits FOR VALUES FROM (%L) TO (%L)',
+                                   part_name, month_start, month_end);
+                    EXECUTE format('INSERT INTO Visits (%s) SELECT %s FROM Visits_Moving',
+                                   stored_columns, stored_columns);
+                    IF to_regclass('room_stays') IS NOT NULL THEN
+                        EXECUTE 'INSERT INTO Room_Stays (Stay_ID, Room_Number, Visit_ID, Visit_Date, Stay_Period)
+                                 SELECT * FROM Room_Stays_Moving';
+                    END IF;
+                    DROP TABLE Visits_Moving, Room_Stays_Moving;
+                    PERFORM set_config('app.archiving', 'off', true);
+                ELSE
+                    EXECUTE format('CREATE TABLE %I PARTITION OF Visits FOR VALUES FROM (%L) TO (%L)',
+                                   part_name, month_start, month_end);
+                END IF;
+                created := created + 1;
+            EXCEPTION WHEN check_violation THEN
+                -- The sub-block is rolled back, rows and temp table included
+                PERFORM set_config('app.archiving', 'off', true);
+                RAISE WARNING 'create_visit_partitions: % left in Visits_Default: %', part_name, SQLERRM;
+            END;
+        END IF;
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+-- Maintenance: keep the next three months of partitions in place. Where pg_cron is
+-- available (on Supabase: Database > Extensions) the job is scheduled for 03:00 on the
+-- 1st of every month; otherwise run the SELECT below from an external scheduler monthly.
+SELECT create_visit_partitions(CURRENT_DATE, (CURRENT_DATE + INTERVAL '3 months')::DATE);
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_cron') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_cron;
+        PERFORM cron.schedule('visit-partitions', '0 3 1 * *',
+            $cron$SELECT create_visit_partitions(CURRENT_DATE, (CURRENT_DATE + INTERVAL '3 months')::DATE)$cron$);
+    ELSE
+        RAISE NOTICE 'pg_cron is not available: schedule create_visit_partitions externally';
+    END IF;
+END;
+$$;
 
 
 
 -- Data insertion
 
-INSERT INTO Patients ( Patient_First_Name, Patient_Last_Name, Age, Gender, Height, Weight, Allergies, Address, Insurance_Provider)
-SELECT DISTINCT
+-- The raw data has no patient ID, so within the seed a first/last name pair is one
+-- patient (latest record wins). Seed_Patients keeps the assigned IDs so visits are
+-- linked through this snapshot rather than by name against Patients, which allows namesakes.
+CREATE TEMP TABLE Seed_Patients AS
+SELECT DISTINCT ON (Patient_First_Name, Patient_Last_Name)
     Patient_First_Name,
     Patient_Last_Name,
     Age,
@@ -102,7 +200,13 @@ SELECT DISTINCT
     Address,
     Insurance_Provider
 FROM PatientRecords
-ON CONFLICT (patient_first_name, patient_last_name) DO NOTHING;
+ORDER BY Patient_First_Name, Patient_Last_Name, Record_ID DESC;
+
+ALTER TABLE Seed_Patients ADD COLUMN Patient_ID INT DEFAULT nextval(pg_get_serial_sequence('patients', 'patient_id'));
+
+INSERT INTO Patients (Patient_ID, Patient_First_Name, Patient_Last_Name, Age, Gender, Height, Weight, Allergies, Address, Insurance_Provider)
+SELECT Patient_ID, Patient_First_Name, Patient_Last_Name, Age, Gender, Height, Weight, Allergies, Address, Insurance_Provider
+FROM Seed_Patients;
 
 
 
@@ -117,9 +221,11 @@ FROM PatientRecords;
 
 
 
+SELECT create_visit_partitions(MIN(Visit_Date), MAX(Visit_Date)) FROM PatientRecords;
+
 INSERT INTO Visits (Patient_ID, Record_ID, Admission_Type, Visit_Date, Room_Number, Doctor_ID, Symptoms, Tests, Diagnosis_Notes, Prescription, Payment_Amount, Payment_Method, Payment_Invoice_Number)
 SELECT
-    p.Patient_ID,
+    sp.Patient_ID,
     pr.Record_ID,
     pr.Admission_Type,
     pr.Visit_Date,
@@ -133,8 +239,8 @@ SELECT
     pr.Payment_Method,
     pr.Payment_Invoice_Number
 FROM PatientRecords pr
-JOIN Patients p ON pr.Patient_First_Name = p.Patient_First_Name
-    AND pr.Patient_Last_Name = p.Patient_Last_Name
+JOIN Seed_Patients sp ON pr.Patient_First_Name = sp.Patient_First_Name
+    AND pr.Patient_Last_Name = sp.Patient_Last_Name
 JOIN Doctors d ON pr.Doctor_Name = d.Doctor_Name
     AND pr.Doctor_Specialty = d.Doctor_Specialty
     AND pr.Doctor_Department = d.Doctor_Department;
@@ -172,3 +278,406 @@ ORDER BY Total_Billing_Amount DESC LIMIT 1;
 
 
 
+-- Duplicate patient detection
+-- Blocking keys (phonetic name codes, age band, address tokens) are kept on each
+-- patient by trigger and indexed with GIN, so a registration-time lookup only
+-- touches patients that share at least one key instead of scanning the table.
+-- Every key combines two identifying fields, so one misspelt field still finds
+-- the record while a common first name or a large building alone matches nothing.
+
+CREATE EXTENSION IF NOT EXISTS fuzzystrmatch;
+
+-- Namesakes are legitimate; likely duplicates are caught by the lookup below instead.
+ALTER TABLE Patients DROP CONSTRAINT IF EXISTS patients_patient_first_name_patient_last_name_key;
+
+CREATE OR REPLACE FUNCTION patient_blocking_keys(p_first_name TEXT, p_last_name TEXT, p_age INT, p_address TEXT)
+RETURNS TEXT[]
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT array_remove(ARRAY[
+        'n:' || last_code || ':' || first_code,
+        'l:' || last_code || ':' || left(first_code, 1) || ':' || (p_age / 5)::TEXT,
+        'f:' || first_code || ':' || left(last_code, 1) || ':' || (p_age / 5)::TEXT,
+        'hl:' || house || ':' || last_code,
+        'hf:' || house || ':' || first_code
+    ], NULL)
+    FROM (SELECT dmetaphone(p_last_name) AS last_code,
+                 dmetaphone(p_first_name) AS first_code,
+                 lower(regexp_replace(substring(p_address from '^\s*(\d+\s+\w+)'), '\s+', ' ', 'g')) AS house) parts;
+$$;
+
+ALTER TABLE Patients ADD COLUMN IF NOT EXISTS Blocking_Keys TEXT[];
+
+CREATE OR REPLACE FUNCTION set_patient_blocking_keys()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.Blocking_Keys := patient_blocking_keys(NEW.Patient_First_Name, NEW.Patient_Last_Name, NEW.Age, NEW.Address);
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_patient_blocking_keys ON Patients;
+CREATE TRIGGER trg_patient_blocking_keys
+BEFORE INSERT OR UPDATE OF Patient_First_Name, Patient_Last_Name, Age, Address ON Patients
+FOR EACH ROW EXECUTE FUNCTION set_patient_blocking_keys();
+
+UPDATE Patients
+SET Blocking_Keys = patient_blocking_keys(Patient_First_Name, Patient_Last_Name, Age, Address)
+WHERE Blocking_Keys IS DISTINCT FROM patient_blocking_keys(Patient_First_Name, Patient_Last_Name, Age, Address);
+
+CREATE INDEX IF NOT EXISTS idx_patients_blocking_keys ON Patients USING GIN (Blocking_Keys);
+
+-- Likely duplicates of a patient about to be registered, best matches first.
+CREATE OR REPLACE FUNCTION find_patient_duplicates(p_first_name TEXT, p_last_name TEXT, p_age INT, p_address TEXT, p_limit INT DEFAULT 5)
+RETURNS TABLE (patient_id INT, patient_first_name VARCHAR, patient_last_name VARCHAR, age INT, address VARCHAR, matched_keys INT)
+LANGUAGE sql STABLE AS $$
+    WITH probe AS (
+        SELECT patient_blocking_keys(p_first_name, p_last_name, p_age, p_address) AS keys
+    )
+    SELECT p.Patient_ID, p.Patient_First_Name, p.Patient_Last_Name, p.Age, p.Address,
+           (SELECT COUNT(*) FROM unnest(p.Blocking_Keys) k WHERE k = ANY(probe.keys))::INT AS matched_keys
+    FROM Patients p, probe
+    WHERE p.Blocking_Keys && probe.keys
+    ORDER BY matched_keys DESC, p.Patient_ID
+    LIMIT p_limit;
+$$;
+
+-- Dimension versions
+-- Every statement that changes Doctors bumps a version counter so clients can
+-- cheaply check whether their cached doctor/department/specialty lists are stale.
+
+CREATE TABLE IF NOT EXISTS Dimension_Versions (
+    Dimension VARCHAR(25) PRIMARY KEY,
+    Version BIGINT NOT NULL DEFAULT 1
+);
+
+INSERT INTO Dimension_Versions (Dimension) VALUES ('doctors')
+ON CONFLICT (Dimension) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_doctors_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE Dimension_Versions SET Version = Version + 1 WHERE Dimension = 'doctors';
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_doctors_version ON Doctors;
+CREATE TRIGGER trg_doctors_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Doctors
+FOR EACH STATEMENT EXECUTE FUNCTION bump_doctors_version();
+
+CREATE OR REPLACE FUNCTION get_doctor_departments()
+RETURNS TABLE (doctor_department VARCHAR)
+LANGUAGE sql STABLE AS $$
+    SELECT DISTINCT Doctor_Department FROM Doctors
+    WHERE Doctor_Department IS NOT NULL
+    ORDER BY 1;
+$$;
+
+CREATE OR REPLACE FUNCTION get_doctor_specialties()
+RETURNS TABLE (doctor_specialty VARCHAR)
+LANGUAGE sql STABLE AS $$
+    SELECT DISTINCT Doctor_Specialty FROM Doctors
+    WHERE Doctor_Specialty IS NOT NULL
+    ORDER BY 1;
+$$;
+
+-- Room allocation
+-- Each inpatient stay books a room for a half-open date range. The GiST exclusion
+-- constraint rejects overlapping stays in the same room, and the same index answers
+-- availability queries without scanning visits.
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+CREATE TABLE IF NOT EXISTS Rooms (
+    Room_Number VARCHAR(10) PRIMARY KEY
+);
+
+INSERT INTO Rooms (Room_Number)
+SELECT DISTINCT Room_Number FROM Visits
+WHERE Room_Number IS NOT NULL AND Room_Number <> 'N/A'
+ON CONFLICT (Room_Number) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS Room_Stays (
+    Stay_ID SERIAL PRIMARY KEY,
+    Room_Number VARCHAR(10) NOT NULL REFERENCES Rooms(Room_Number),
+    Visit_ID INT,
+    Visit_Date DATE,
+    Stay_Period DATERANGE NOT NULL,
+    FOREIGN KEY (Visit_ID, Visit_Date) REFERENCES Visits(Visit_ID, Visit_Date),
+    EXCLUDE USING GIST (Room_Number WITH =, Stay_Period WITH &&)
+);
+
+-- Rooms with no stay overlapping [p_start, p_end).
+CREATE OR REPLACE FUNCTION find_free_rooms(p_start DATE, p_end DATE)
+RETURNS TABLE (room_number VARCHAR)
+LANGUAGE sql STABLE AS $$
+    SELECT r.Room_Number FROM Rooms r
+    WHERE NOT EXISTS (
+        SELECT 1 FROM Room_Stays s
+        WHERE s.Room_Number = r.Room_Number
+          AND s.Stay_Period && daterange(p_start, p_end)
+    )
+    ORDER BY r.Room_Number;
+$$;
+
+-- Parameterized reports
+-- Server-side versions of the analytical queries above. Dates are optional
+-- (NULL means unbounded) and results are capped at p_limit rows (at most 100).
+-- Date bounds are plain comparisons on Visit_Date so visit partitions are pruned.
+
+CREATE OR REPLACE FUNCTION report_patient_visit_counts(p_start DATE DEFAULT NULL, p_end DATE DEFAULT NULL, p_limit INT DEFAULT 10)
+RETURNS TABLE (patient_id INT, patient_first_name VARCHAR, patient_last_name VARCHAR, age INT, gender CHAR, visit_count BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT p.Patient_ID, p.Patient_First_Name, p.Patient_Last_Name, p.Age, p.Gender, COUNT(v.Visit_ID) AS Visit_Count
+    FROM Patients p INNER JOIN Visits v ON p.Patient_ID = v.Patient_ID
+    WHERE v.Visit_Date >= COALESCE(p_start, '-infinity'::DATE)
+      AND v.Visit_Date <= COALESCE(p_end, 'infinity'::DATE)
+    GROUP BY p.Patient_ID, p.Patient_First_Name, p.Patient_Last_Name, p.Age, p.Gender
+    ORDER BY Visit_Count DESC, p.Patient_ID
+    LIMIT LEAST(p_limit, 100);
+$$;
+
+CREATE OR REPLACE FUNCTION report_patients_over_payment(p_min_total NUMERIC DEFAULT 500, p_start DATE DEFAULT NULL, p_end DATE DEFAULT NULL, p_limit INT DEFAULT 10)
+RETURNS TABLE (patient_id INT, patient_first_name VARCHAR, patient_last_name VARCHAR, total_payment NUMERIC, visit_count BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT p.Patient_ID, p.Patient_First_Name, p.Patient_Last_Name, SUM(v.Payment_Amount) AS Total_Payment, COUNT(v.Visit_ID) AS Visit_Count
+    FROM Patients p INNER JOIN Visits v ON p.Patient_ID = v.Patient_ID
+    WHERE v.Visit_Date >= COALESCE(p_start, '-infinity'::DATE)
+      AND v.Visit_Date <= COALESCE(p_end, 'infinity'::DATE)
+    GROUP BY p.Patient_ID, p.Patient_First_Name, p.Patient_Last_Name
+    HAVING SUM(v.Payment_Amount) > p_min_total
+    ORDER BY Total_Payment DESC, p.Patient_ID
+    LIMIT LEAST(p_limit, 100);
+$$;
+
+CREATE OR REPLACE FUNCTION report_doctor_billing(p_start DATE DEFAULT NULL, p_end DATE DEFAULT NULL, p_limit INT DEFAULT 10)
+RETURNS TABLE (doctor_id INT, doctor_name VARCHAR, total_billing_amount NUMERIC)
+LANGUAGE sql STABLE AS $$
+    SELECT d.Doctor_ID, d.Doctor_Name, SUM(v.Payment_Amount) AS Total_Billing_Amount
+    FROM Doctors d INNER JOIN Visits v ON d.Doctor_ID = v.Doctor_ID
+    WHERE v.Visit_Date >= COALESCE(p_start, '-infinity'::DATE)
+      AND v.Visit_Date <= COALESCE(p_end, 'infinity'::DATE)
+    GROUP BY d.Doctor_ID, d.Doctor_Name
+    ORDER BY Total_Billing_Amount DESC, d.Doctor_ID
+    LIMIT LEAST(p_limit, 100);
+$$;
+
+-- Idempotency keys for journaled writes
+-- Writes queued in the app's local journal carry a key so a batch that is
+-- replayed after a dropped connection is applied only once.
+
+ALTER TABLE Patients ADD COLUMN IF NOT EXISTS Idempotency_Key UUID UNIQUE;
+ALTER TABLE Visits ADD COLUMN IF NOT EXISTS Idempotency_Key UUID;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_visits_idempotency_key ON Visits (Idempotency_Key, Visit_Date);
+ALTER TABLE Doctors ADD COLUMN IF NOT EXISTS Idempotency_Key UUID UNIQUE;
+
+-- Per-patient and per-doctor counters
+-- Kept exact by a row trigger on Visits so profile pages read one row instead of
+-- aggregating all visits. Deletes made by the visit archiver leave them untouched,
+-- since archived visits are still part of each patient's history.
+
+CREATE INDEX IF NOT EXISTS idx_visits_patient_date ON Visits (Patient_ID, Visit_Date);
+
+CREATE TABLE IF NOT EXISTS Patient_Stats (
+    Patient_ID INT PRIMARY KEY REFERENCES Patients(Patient_ID) ON DELETE CASCADE,
+    Visit_Count INT NOT NULL DEFAULT 0,
+    Total_Payment DECIMAL(12,2) NOT NULL DEFAULT 0,
+    Last_Visit_Date DATE
+);
+
+CREATE TABLE IF NOT EXISTS Doctor_Stats (
+    Doctor_ID INT PRIMARY KEY REFERENCES Doctors(Doctor_ID) ON DELETE CASCADE,
+    Visit_Count INT NOT NULL DEFAULT 0,
+    Total_Billing DECIMAL(12,2) NOT NULL DEFAULT 0
+);
+
+INSERT INTO Patient_Stats (Patient_ID, Visit_Count, Total_Payment, Last_Visit_Date)
+SELECT Patient_ID, COUNT(*), COALESCE(SUM(Payment_Amount), 0), MAX(Visit_Date)
+FROM Visits WHERE Patient_ID IS NOT NULL
+GROUP BY Patient_ID
+ON CONFLICT (Patient_ID) DO UPDATE SET
+    Visit_Count = EXCLUDED.Visit_Count,
+    Total_Payment = EXCLUDED.Total_Payment,
+    Last_Visit_Date = EXCLUDED.Last_Visit_Date;
+
+INSERT INTO Doctor_Stats (Doctor_ID, Visit_Count, Total_Billing)
+SELECT Doctor_ID, COUNT(*), COALESCE(SUM(Payment_Amount), 0)
+FROM Visits WHERE Doctor_ID IS NOT NULL
+GROUP BY Doctor_ID
+ON CONFLICT (Doctor_ID) DO UPDATE SET
+    Visit_Count = EXCLUDED.Visit_Count,
+    Total_Billing = EXCLUDED.Total_Billing;
+
+CREATE OR REPLACE FUNCTION maintain_visit_stats()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF current_setting('app.archiving', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE Patient_Stats SET
+            Visit_Count = Visit_Count - 1,
+            Total_Payment = Total_Payment - COALESCE(OLD.Payment_Amount, 0),
+            Last_Visit_Date = (SELECT MAX(Visit_Date) FROM Visits WHERE Patient_ID = OLD.Patient_ID)
+        WHERE Patient_ID = OLD.Patient_ID;
+
+        UPDATE Doctor_Stats SET
+            Visit_Count = Visit_Count - 1,
+            Total_Billing = Total_Billing - COALESCE(OLD.Payment_Amount, 0)
+        WHERE Doctor_ID = OLD.Doctor_ID;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF NEW.Patient_ID IS NOT NULL THEN
+            INSERT INTO Patient_Stats (Patient_ID, Visit_Count, Total_Payment, Last_Visit_Date)
+            VALUES (NEW.Patient_ID, 1, COALESCE(NEW.Payment_Amount, 0), NEW.Visit_Date)
+            ON CONFLICT (Patient_ID) DO UPDATE SET
+                Visit_Count = Patient_Stats.Visit_Count + 1,
+                Total_Payment = Patient_Stats.Total_Payment + EXCLUDED.Total_Payment,
+                Last_Visit_Date = GREATEST(Patient_Stats.Last_Visit_Date, EXCLUDED.Last_Visit_Date);
+        END IF;
+
+        IF NEW.Doctor_ID IS NOT NULL THEN
+            INSERT INTO Doctor_Stats (Doctor_ID, Visit_Count, Total_Billing)
+            VALUES (NEW.Doctor_ID, 1, COALESCE(NEW.Payment_Amount, 0))
+            ON CONFLICT (Doctor_ID) DO UPDATE SET
+                Visit_Count = Doctor_Stats.Visit_Count + 1,
+                Total_Billing = Doctor_Stats.Total_Billing + EXCLUDED.Total_Billing;
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_visit_stats ON Visits;
+CREATE TRIGGER trg_visit_stats
+AFTER INSERT OR DELETE OR UPDATE OF Patient_ID, Doctor_ID, Payment_Amount, Visit_Date ON Visits
+FOR EACH ROW EXECUTE FUNCTION maintain_visit_stats();
+
+-- Deletes visits that have been copied to the archive without touching the counters.
+-- Only the archived IDs go: a backdated visit inserted after the archive was read stays.
+-- The date range just lets the planner skip partitions outside the archived month.
+-- Their room stays go first (the archived visit keeps its Room_Number); stays that
+-- old no longer affect room availability.
+CREATE OR REPLACE FUNCTION archive_delete_visits(p_ids INT[], p_from DATE, p_to DATE)
+RETURNS BIGINT
+LANGUAGE plpgsql AS $$
+DECLARE
+    deleted BIGINT;
+BEGIN
+    PERFORM set_config('app.archiving', 'on', true);
+    DELETE FROM Room_Stays
+    WHERE Visit_ID = ANY(p_ids) AND Visit_Date >= p_from AND Visit_Date < p_to;
+    DELETE FROM Visits
+    WHERE Visit_ID = ANY(p_ids) AND Visit_Date >= p_from AND Visit_Date < p_to;
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    PERFORM set_config('app.archiving', 'off', true);
+    RETURN deleted;
+END;
+$$;
+
+-- Remittance reconciliation
+-- Invoice numbers from payer remittance files are matched in batches through this index.
+
+CREATE INDEX IF NOT EXISTS idx_visits_invoice_number ON Visits (Payment_Invoice_Number);
+
+CREATE OR REPLACE FUNCTION match_remittance_invoices(p_invoices TEXT[])
+RETURNS TABLE (visit_id INT, payment_invoice_number VARCHAR, payment_amount NUMERIC)
+LANGUAGE sql STABLE AS $$
+    SELECT Visit_ID, Payment_Invoice_Number, Payment_Amount FROM Visits
+    WHERE Payment_Invoice_Number = ANY(p_invoices);
+$$;
+
+-- Clinical full-text search
+-- A stored tsvector over the clinical text fields (diagnosis notes weighted highest)
+-- with a GIN index. Matches are ranked first and snippets are built only for the
+-- requested page.
+
+ALTER TABLE Visits ADD COLUMN IF NOT EXISTS Clinical_Search TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', COALESCE(Diagnosis_Notes, '')), 'A') ||
+    setweight(to_tsvector('english', COALESCE(Symptoms, '')), 'B') ||
+    setweight(to_tsvector('english', COALESCE(Prescription, '')), 'C') ||
+    setweight(to_tsvector('english', COALESCE(Tests, '')), 'C')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_visits_clinical_search ON Visits USING GIN (Clinical_Search);
+
+CREATE OR REPLACE FUNCTION search_visits(p_query TEXT, p_limit INT DEFAULT 20, p_offset INT DEFAULT 0)
+RETURNS TABLE (record_id INT, visit_id INT, visit_date DATE, patient_id INT, patient_first_name VARCHAR,
+               patient_last_name VARCHAR, doctor_name VARCHAR, rank REAL, snippet TEXT)
+LANGUAGE sql STABLE AS $$
+    WITH q AS (
+        SELECT websearch_to_tsquery('english', p_query) AS query
+    ),
+    ranked AS (
+        SELECT v.Record_ID, v.Visit_ID, v.Visit_Date, v.Patient_ID, v.Doctor_ID,
+               concat_ws(' | ', v.Symptoms, v.Tests, v.Diagnosis_Notes, v.Prescription) AS body,
+               ts_rank(v.Clinical_Search, q.query) AS rank
+        FROM Visits v, q
+        WHERE v.Clinical_Search @@ q.query
+        ORDER BY rank DESC, v.Visit_Date DESC
+        LIMIT LEAST(p_limit, 100) OFFSET p_offset
+    )
+    SELECT r.Record_ID, r.Visit_ID, r.Visit_Date, r.Patient_ID, p.Patient_First_Name, p.Patient_Last_Name,
+           d.Doctor_Name, r.rank,
+           ts_headline('english', r.body, q.query, 'StartSel=**, StopSel=**, MaxFragments=2, MaxWords=20, MinWords=5')
+    FROM ranked r
+    CROSS JOIN q
+    LEFT JOIN Patients p ON p.Patient_ID = r.Patient_ID
+    LEFT JOIN Doctors d ON d.Doctor_ID = r.Doctor_ID
+    ORDER BY r.rank DESC, r.Visit_Date DESC;
+$$;
+
+-- Patient visit timeline
+-- Newest-first windows of one patient's visits with doctor details. Older windows
+-- continue from the last (Visit_Date, Visit_ID) shown, walking the
+-- (Patient_ID, Visit_Date) index instead of counting past rows with OFFSET.
+
+CREATE OR REPLACE FUNCTION patient_visit_timeline(p_patient_id INT, p_before_date DATE DEFAULT NULL,
+                                                  p_before_visit_id INT DEFAULT NULL, p_limit INT DEFAULT 10)
+RETURNS TABLE (visit_id INT, record_id INT, visit_date DATE, admission_type VARCHAR, room_number VARCHAR,
+               doctor_name VARCHAR, doctor_department VARCHAR, symptoms VARCHAR, diagnosis_notes VARCHAR,
+               prescription VARCHAR, payment_amount NUMERIC)
+LANGUAGE sql STABLE AS $$
+    SELECT v.Visit_ID, v.Record_ID, v.Visit_Date, v.Admission_Type, v.Room_Number,
+           d.Doctor_Name, d.Doctor_Department, v.Symptoms, v.Diagnosis_Notes, v.Prescription, v.Payment_Amount
+    FROM Visits v
+    LEFT JOIN Doctors d ON d.Doctor_ID = v.Doctor_ID
+    WHERE v.Patient_ID = p_patient_id
+      AND (p_before_date IS NULL
+           OR (v.Visit_Date, v.Visit_ID) < (p_before_date, COALESCE(p_before_visit_id, 2147483647)))
+    ORDER BY v.Visit_Date DESC, v.Visit_ID DESC
+    LIMIT LEAST(p_limit, 100);
+$$;
+
+-- Inserts an inpatient visit and books its room in one transaction. If the room is
+-- taken for any part of the stay, the exclusion constraint rolls back the visit too.
+CREATE OR REPLACE FUNCTION insert_visit_with_room(p_visit JSONB, p_discharge_date DATE)
+RETURNS TABLE (visit_id INT, record_id INT)
+LANGUAGE plpgsql AS $$
+DECLARE
+    new_visit_id INT;
+    new_record_id INT;
+    new_room VARCHAR(10);
+    new_date DATE;
+BEGIN
+    INSERT INTO Visits (Patient_ID, Admission_Type, Visit_Date, Room_Number, Doctor_ID, Symptoms, Tests,
+                        Diagnosis_Notes, Prescription, Payment_Amount, Payment_Method, Payment_Invoice_Number)
+    SELECT r.Patient_ID, r.Admission_Type, r.Visit_Date, r.Room_Number, r.Doctor_ID, r.Symptoms, r.Tests,
+           r.Diagnosis_Notes, r.Prescription, r.Payment_Amount, r.Payment_Method, r.Payment_Invoice_Number
+    FROM jsonb_populate_record(NULL::Visits, p_visit) r
+    RETURNING Visits.Visit_ID, Visits.Record_ID, Visits.Room_Number, Visits.Visit_Date
+    INTO new_visit_id, new_record_id, new_room, new_date;
+
+    INSERT INTO Room_Stays (Room_Number, Visit_ID, Visit_Date, Stay_Period)
+    VALUES (new_room, new_visit_id, new_date, daterange(new_date, p_discharge_date));
+
+    RETURN QUERY SELECT new_visit_id, new_record_id;
+END;
+$$;
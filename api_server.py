@@ -0,0 +1,276 @@
+import hmac
+import json
+import os
+import re
+import traceback
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+import data_access
+
+
+# 🔌 Headless JSON API for integrations (lab systems, kiosk check-in)
+load_dotenv()
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# Integrations send API_TOKEN as "Authorization: Bearer <token>" or "X-API-Key: <token>"
+API_TOKEN = os.getenv("API_TOKEN")
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 500
+
+# Postgres SQLSTATEs (as carried on postgrest.APIError.code) that mean the request itself was bad
+CONSTRAINT_ERRORS = {
+    "23502": (400, "A required field is missing."),
+    "23503": (400, "A referenced patient, doctor or room does not exist."),
+    "23505": (409, "A record with these values already exists."),
+    "23514": (400, "A field value is out of range."),
+    "23P01": (409, "The room is already booked for part of this stay."),
+}
+
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _authorized(headers):
+    if not API_TOKEN:
+        return False
+    token = headers.get("X-API-Key")
+    if token is None:
+        scheme, _, credentials = (headers.get("Authorization") or "").partition(" ")
+        token = credentials.strip() if scheme.lower() == "bearer" else ""
+    return hmac.compare_digest(token.encode(), API_TOKEN.encode())
+
+
+def _database_error(error):
+    """Maps a database validation error to a client error with a safe message, or None."""
+    code = str(getattr(error, "code", "") or "")
+    if code in CONSTRAINT_ERRORS:
+        return CONSTRAINT_ERRORS[code]
+    if code.startswith("23"):
+        return 400, "The record violates a database constraint."
+    if code.startswith("22"):
+        return 400, "A field has an invalid value."
+    return None
+
+
+def _page(query):
+    try:
+        limit = int(query.get("limit", DEFAULT_PAGE_SIZE))
+        offset = int(query.get("offset", 0))
+    except ValueError:
+        raise ApiError(400, "limit and offset must be integers.")
+    if limit < 1 or offset < 0:
+        raise ApiError(400, "limit must be positive and offset non-negative.")
+    return min(limit, MAX_PAGE_SIZE), offset
+
+
+def _paginated(rows, limit, offset):
+    return {
+        "data": rows,
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if len(rows) == limit else None
+    }
+
+
+def _batch(body, fields):
+    """Accepts one object or a list of objects and rejects unknown fields."""
+    rows = body if isinstance(body, list) else [body]
+    if not rows or len(rows) > MAX_BATCH_SIZE:
+        raise ApiError(400, f"Send between 1 and {MAX_BATCH_SIZE} records.")
+    for row in rows:
+        if not isinstance(row, dict):
+            raise ApiError(400, "Each record must be a JSON object.")
+        unknown = set(row) - set(fields)
+        if unknown:
+            raise ApiError(400, f"Unknown fields: {', '.join(sorted(unknown))}")
+    return rows
+
+
+# -----------------------------
+# Endpoints
+# -----------------------------
+def search_patients(query, body):
+    term = query.get("q", "")
+    if len(term.strip()) < 2:
+        raise ApiError(400, "q must have at least 2 characters.")
+    limit, offset = _page(query)
+    return 200, _paginated(data_access.search_patients(supabase, term, limit, offset), limit, offset)
+
+
+def insert_patients(query, body):
+    return 201, {"data": data_access.insert_patients(supabase, _batch(body, data_access.PATIENT_FIELDS))}
+
+
+def insert_visits(query, body):
+    rows = _batch(body, data_access.VISIT_FIELDS + ("discharge_date",))
+    inpatients = [row for row in rows if str(row.get("admission_type", "")).lower() == "inpatient"]
+    if not inpatients:
+        if any("discharge_date" in row for row in rows):
+            raise ApiError(400, "discharge_date only applies to inpatient visits.")
+        return 201, {"data": data_access.insert_visits(supabase, rows)}
+
+    # Inpatients go through the same room booking as the UI, one stay per request
+    if len(rows) > 1:
+        raise ApiError(400, "Send inpatient visits one per request.")
+    visit = dict(inpatients[0])
+    discharge_date = visit.pop("discharge_date", None)
+    if not visit.get("room_number") or not discharge_date:
+        raise ApiError(400, "Inpatient visits need room_number and discharge_date.")
+    try:
+        if date.fromisoformat(discharge_date) <= date.fromisoformat(visit.get("visit_date") or ""):
+            raise ApiError(400, "discharge_date must be after visit_date.")
+    except (TypeError, ValueError):
+        raise ApiError(400, "visit_date and discharge_date must be YYYY-MM-DD.")
+    return 201, {"data": data_access.insert_visit_with_room(supabase, visit, discharge_date)}
+
+
+def search_visits(query, body):
+    term = query.get("q", "")
+    if not term.strip():
+        raise ApiError(400, "q is required.")
+    limit, offset = _page(query)
+    limit = min(limit, 100)
+    return 200, _paginated(data_access.search_visits(supabase, term, limit, offset), limit, offset)
+
+
+def get_visit(query, body, record_id):
+    visit = data_access.get_visit_details(supabase, record_id)
+    if visit is None:
+        raise ApiError(404, f"No visit with record_id {record_id}.")
+    return 200, {"data": visit}
+
+
+def update_visit(query, body, record_id):
+    if not isinstance(body, dict) or not body:
+        raise ApiError(400, "Send a single JSON object of changes.")
+    changes = _batch(body, data_access.VISIT_UPDATE_FIELDS)[0]
+    rows = data_access.update_visit(supabase, record_id, changes)
+    if not rows:
+        raise ApiError(404, f"No visit with record_id {record_id}.")
+    return 200, {"data": rows}
+
+
+def patient_timeline(query, body, patient_id):
+    limit, _ = _page(query)
+    limit = min(limit, 100)
+    before_date = query.get("before_date")
+    before_visit_id = query.get("before_visit_id")
+    try:
+        if before_date:
+            date.fromisoformat(before_date)
+        before_visit_id = int(before_visit_id) if before_visit_id else None
+    except ValueError:
+        raise ApiError(400, "before_date must be YYYY-MM-DD and before_visit_id an integer.")
+    if (before_date is None) != (before_visit_id is None):
+        raise ApiError(400, "Send before_date and before_visit_id together.")
+    rows = data_access.get_patient_timeline(supabase, int(patient_id), before_date, before_visit_id, limit)
+    cursor = None
+    if len(rows) == limit:
+        cursor = {"before_date": rows[-1]["visit_date"], "before_visit_id": rows[-1]["visit_id"]}
+    return 200, {"data": rows, "limit": limit, "next": cursor}
+
+
+def list_doctors(query, body):
+    limit, offset = _page(query)
+    return 200, _paginated(data_access.list_doctors(supabase, limit, offset), limit, offset)
+
+
+def filter_invoices(query, body):
+    limit, offset = _page(query)
+    rows = data_access.filter_invoices(supabase, query.get("payment_method"), query.get("from"), query.get("to"),
+                                       limit, offset)
+    return 200, _paginated(rows, limit, offset)
+
+
+ROUTES = [
+    ("GET", re.compile(r"^/patients$"), search_patients),
+    ("POST", re.compile(r"^/patients$"), insert_patients),
+    ("GET", re.compile(r"^/patients/(\d+)/visits$"), patient_timeline),
+    ("POST", re.compile(r"^/visits$"), insert_visits),
+    ("GET", re.compile(r"^/visits/search$"), search_visits),
+    ("GET", re.compile(r"^/visits/(\d+)$"), get_visit),
+    ("PATCH", re.compile(r"^/visits/(\d+)$"), update_visit),
+    ("GET", re.compile(r"^/doctors$"), list_doctors),
+    ("GET", re.compile(r"^/invoices$"), filter_invoices),
+]
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    # Keep-alive connections avoid a TCP handshake per request
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, default=str).encode()
+        self.send_response(status)
+        if status == 401:
+            self.send_header("WWW-Authenticate", "Bearer")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method):
+        if not _authorized(self.headers):
+            # The unread body would otherwise be parsed as the next request on this connection
+            self.close_connection = True
+            return self._send(401, {"error": "Missing or invalid API token."})
+
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else {}
+        except ValueError:
+            return self._send(400, {"error": "Request body must be valid JSON."})
+
+        for route_method, pattern, handler in ROUTES:
+            match = pattern.match(url.path)
+            if match and route_method == method:
+                try:
+                    status, payload = handler(query, body, *match.groups())
+                except ApiError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    client_error = _database_error(e)
+                    if client_error:
+                        status, payload = client_error[0], {"error": client_error[1]}
+                    else:
+                        # Details stay in the server log; database errors can reveal schema and data
+                        traceback.print_exc()
+                        status, payload = 500, {"error": "Internal server error."}
+                return self._send(status, payload)
+        self._send(404, {"error": f"No route for {method} {url.path}."})
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    if not API_TOKEN:
+        raise SystemExit("Set API_TOKEN before starting the API.")
+    server = ThreadingHTTPServer((API_HOST, API_PORT), ApiHandler)
+    print(f"Hospital API listening on http://{API_HOST}:{API_PORT}")
+    server.serve_forever()
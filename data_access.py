@@ -0,0 +1,119 @@
+import dimension_cache
+
+
+# 🧾 Columns and writable fields shared by the Streamlit pages and the JSON API
+PATIENT_SEARCH_COLUMNS = "patient_id, patient_first_name, patient_last_name"
+INVOICE_COLUMNS = "patient_id, visit_id, record_id, visit_date, room_number, tests, payment_amount, payment_method"
+
+PATIENT_FIELDS = ("patient_first_name", "patient_last_name", "age", "gender", "height", "weight",
+                  "allergies", "address", "insurance_provider")
+VISIT_FIELDS = ("patient_id", "admission_type", "visit_date", "room_number", "doctor_id", "symptoms", "tests",
+                "diagnosis_notes", "prescription", "payment_amount", "payment_method", "payment_invoice_number")
+VISIT_UPDATE_FIELDS = ("symptoms", "tests", "diagnosis_notes", "prescription")
+
+
+def _clean_term(term):
+    # Commas and parentheses would break out of the PostgREST or=() filter
+    return "".join(ch for ch in term if ch not in ",()").strip()
+
+
+# 🔍 Patients whose first or last name contains the term, one page at a time
+def search_patients(client, name, limit=20, offset=0, columns=PATIENT_SEARCH_COLUMNS):
+    name = _clean_term(name)
+    response = client.table("patients") \
+        .select(columns) \
+        .or_(f"patient_first_name.ilike.%{name}%,patient_last_name.ilike.%{name}%") \
+        .order("patient_last_name") \
+        .range(offset, offset + limit - 1) \
+        .execute()
+    return response.data if response.data else []
+
+
+# 📤 Batch inserts return the inserted rows
+def insert_patients(client, patients):
+    return client.table("patients").insert(patients).execute().data or []
+
+
+def insert_visits(client, visits):
+    return client.table("visits").insert(visits).execute().data or []
+
+
+# 🛏️ Inpatient visit and its room booking, inserted together or not at all
+def insert_visit_with_room(client, visit, discharge_date):
+    response = client.rpc("insert_visit_with_room", {
+        "p_visit": visit,
+        "p_discharge_date": str(discharge_date)
+    }).execute()
+    return response.data if response.data else []
+
+
+# 🔍 Visit by record_id with patient and doctor names
+def get_visit_details(client, record_id):
+    # 1. Get visit row
+    visit_resp = client.table("visits").select("*").eq("record_id", record_id).limit(1).execute()
+    if not visit_resp.data:
+        return None
+    visit = visit_resp.data[0]
+
+    # 2. Get patient info
+    patient_resp = client.table("patients").select("patient_first_name, patient_last_name") \
+        .eq("patient_id", visit["patient_id"]).limit(1).execute()
+    patient = patient_resp.data[0] if patient_resp.data else {}
+
+    # 3. Get doctor info
+    doctor_resp = client.table("doctors").select("doctor_name") \
+        .eq("doctor_id", visit["doctor_id"]).limit(1).execute()
+    doctor = doctor_resp.data[0] if doctor_resp.data else {}
+
+    # 4. Combine all into one dictionary
+    return {
+        "record_id": visit["record_id"],
+        "patient_first_name": patient.get("patient_first_name", ""),
+        "patient_last_name": patient.get("patient_last_name", ""),
+        "doctor_name": doctor.get("doctor_name", ""),
+        "symptoms": visit["symptoms"],
+        "tests": visit["tests"],
+        "diagnosis_notes": visit["diagnosis_notes"],
+        "prescription": visit["prescription"]
+    }
+
+
+# 🔎 Ranked full-text search over symptoms, tests, diagnosis notes and prescriptions
+def search_visits(client, query, limit=20, offset=0):
+    response = client.rpc("search_visits", {"p_query": query, "p_limit": limit, "p_offset": offset}).execute()
+    return response.data if response.data else []
+
+
+# 📝 Update clinical fields of a visit; returns the updated rows
+def update_visit(client, record_id, changes):
+    return client.table("visits").update(changes).eq("record_id", record_id).execute().data or []
+
+
+# 🗓️ One window of a patient's visits, newest first, older than the given visit
+def get_patient_timeline(client, patient_id, before_date=None, before_visit_id=None, limit=10):
+    response = client.rpc("patient_visit_timeline", {
+        "p_patient_id": patient_id,
+        "p_before_date": str(before_date) if before_date else None,
+        "p_before_visit_id": before_visit_id,
+        "p_limit": limit
+    }).execute()
+    return response.data if response.data else []
+
+
+# 👨‍⚕️ Doctors from the shared dimension cache
+def list_doctors(client, limit=None, offset=0):
+    doctors = dimension_cache.get_doctors(client)
+    return doctors[offset:offset + limit] if limit else doctors[offset:]
+
+
+# 💳 Invoices filtered by payment method and visit date range
+def filter_invoices(client, payment_method=None, start_date=None, end_date=None, limit=100, offset=0,
+                    columns=INVOICE_COLUMNS):
+    query = client.table("visits").select(columns)
+    if payment_method:
+        query = query.eq("payment_method", payment_method)
+    if start_date:
+        query = query.gte("visit_date", str(start_date))
+    if end_date:
+        query = query.lte("visit_date", str(end_date))
+    return query.order("visit_date", desc=True).order("visit_id").range(offset, offset + limit - 1).execute().data or []
@@ -0,0 +1,89 @@
+import threading
+import time
+import single_flight
+
+
+# ⏱️ How often a process asks the database whether the doctor dimension changed
+VERSION_CHECK_INTERVAL = 30
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def _load_version(client):
+    response = client.table("dimension_versions") \
+        .select("version") \
+        .eq("dimension", "doctors") \
+        .limit(1) \
+        .execute()
+    return response.data[0]["version"] if response.data else None
+
+
+# 🔢 Current version of the doctor dimension (None if it cannot be read)
+def dimension_version(client):
+    try:
+        return single_flight.do(("dimension_version", "doctors"), _load_version, client)
+    except Exception:
+        return None
+
+
+def _load_doctors(client):
+    response = client.table("doctors") \
+        .select("doctor_id, doctor_name, doctor_specialty, doctor_department") \
+        .order("doctor_name") \
+        .execute()
+    return response.data if response.data else []
+
+
+def _load_departments(client):
+    response = client.rpc("get_doctor_departments").execute()
+    return [row["doctor_department"] for row in response.data or []]
+
+
+def _load_specialties(client):
+    response = client.rpc("get_doctor_specialties").execute()
+    return [row["doctor_specialty"] for row in response.data or []]
+
+
+def _get(client, name, loader):
+    """
+    Returns the cached list for a dimension, refetching it only when the
+    server-side version has moved since it was loaded. The version itself is
+    checked at most once per VERSION_CHECK_INTERVAL.
+    """
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(name)
+        if entry and now - entry["checked_at"] < VERSION_CHECK_INTERVAL:
+            return entry["data"]
+
+    version = dimension_version(client)
+    with _lock:
+        entry = _cache.get(name)
+        if entry and version is not None and entry["version"] == version:
+            entry["checked_at"] = now
+            return entry["data"]
+
+    data = single_flight.do(("dimension", name), loader, client)
+    with _lock:
+        _cache[name] = {"version": version, "checked_at": now, "data": data}
+    return data
+
+
+# 👨‍⚕️ Cached dimension lists (shared by all sessions, treat as read-only)
+def get_doctors(client):
+    return _get(client, "doctors", _load_doctors)
+
+
+def get_departments(client):
+    return _get(client, "departments", _load_departments)
+
+
+def get_specialties(client):
+    return _get(client, "specialties", _load_specialties)
+
+
+# 🧹 Drop cached lists after this process changes the doctors table
+def invalidate():
+    with _lock:
+        _cache.clear()
@@ -1,9 +1,15 @@
 import streamlit as st
-import pandas as pd
 import base64
 import os
+from datetime import date
 from dotenv import load_dotenv
 from supabase import create_client, Client
+import data_access
+import dimension_cache
+import report_jobs
+import shared_frames
+import visit_archive
+import write_journal
 
 
 # ✅ Load environment variables from .env
@@ -82,14 +88,33 @@ st.markdown(force_light_theme_style(), unsafe_allow_html=True)
 
 st.title("Patients")
 
+if write_journal.enabled():
+    write_journal.show_status_sidebar(supabase)
+
 # 📥 Fetch all patient data
 def fetch_patient_data():
     response = supabase.table("patients").select("*").execute()
     return response.data if response.data else []
 
+# 📈 Patients with their maintained visit counters (one stats row per patient)
+def fetch_patient_data_with_stats():
+    response = supabase.table("patients") \
+        .select("*, patient_stats(visit_count, total_payment, last_visit_date)") \
+        .execute()
+    patients = []
+    for row in response.data or []:
+        stats = row.pop("patient_stats", None) or {}
+        if isinstance(stats, list):
+            stats = stats[0] if stats else {}
+        row["visit_count"] = stats.get("visit_count", 0)
+        row["total_payment"] = stats.get("total_payment", 0)
+        row["last_visit_date"] = stats.get("last_visit_date")
+        patients.append(row)
+    return patients
+
 # 📤 Insert a new patient record
 def insert_patient_data(first_name, last_name, age, gender, height, weight, allergies, address, insurance_provider):
-    response = supabase.table("patients").insert({
+    patient = {
         "patient_first_name": first_name,
         "patient_last_name": last_name,
         "age": age,
@@ -99,18 +124,49 @@ def insert_patient_data(first_name, last_name, age, gender, height, weight, alle
         "allergies": allergies,
         "address": address,
         "insurance_provider": insurance_provider
-    }).execute()
+    }
+    if write_journal.enabled():
+        write_journal.record_insert(supabase, "patients", patient)
+        st.session_state.pop("patient_search_cache", None)
+        st.success("Patient record saved and queued for sync.")
+        return
+    try:
+        data_access.insert_patients(supabase, [patient])
+    except Exception as e:
+        st.error(f"Error adding patient: {e}")
+        return
+    shared_frames.invalidate("patients_with_stats")
+    # The Visits page typeahead must not keep hiding the new patient
+    st.session_state.pop("patient_search_cache", None)
     st.success("Patient record added successfully!")
 
+# 🧬 Likely existing records for a patient about to be registered
+def find_duplicate_candidates(first_name, last_name, age, address, limit=5):
+    try:
+        response = supabase.rpc("find_patient_duplicates", {
+            "p_first_name": first_name,
+            "p_last_name": last_name,
+            "p_age": age,
+            "p_address": address,
+            "p_limit": limit
+        }).execute()
+        return response.data if response.data else []
+    except Exception as e:
+        st.warning(f"Duplicate check unavailable: {e}")
+        return []
+
 # 🗑️ Delete patient by ID
 def delete_patient_record(patient_id):
     supabase.table("patients").delete().eq("patient_id", patient_id).execute()
+    shared_frames.invalidate("patients_with_stats")
+    st.session_state.pop("patient_search_cache", None)
     st.success("Patient record deleted successfully!")
 
 # 📊 Display patient data in table
 def display_patient_data(patient_data):
-    if patient_data:
-        df = pd.DataFrame(patient_data)
+    import pandas as pd
+    if len(patient_data):
+        df = pd.DataFrame(patient_data).drop(columns=["blocking_keys", "idempotency_key"], errors="ignore")
         # Optionally format columns for UI
         df = df.rename(columns={
             "patient_id": "Patient ID",
@@ -122,7 +178,10 @@ def display_patient_data(patient_data):
             "weight": "Weight (kg)",
             "allergies": "Allergies",
             "address": "Address",
-            "insurance_provider": "Insurance Provider"
+            "insurance_provider": "Insurance Provider",
+            "visit_count": "Visits",
+            "total_payment": "Total Paid",
+            "last_visit_date": "Last Visit"
         })
         st.dataframe(df)
     else:
@@ -131,8 +190,9 @@ def display_patient_data(patient_data):
 
 # 🧾 Display data with delete checkboxes
 def display_patient_data_with_delete(patient_data):
+    import pandas as pd
     if patient_data:
-        df = pd.DataFrame(patient_data)
+        df = pd.DataFrame(patient_data).drop(columns=["blocking_keys", "idempotency_key"], errors="ignore")
         df["Delete"] = df.apply(lambda row: st.checkbox("", value=False, key=f"delete_{row['patient_id']}"), axis=1)
         st.dataframe(df.drop(columns=["Delete"]))
         to_delete = [row["patient_id"] for _, row in df.iterrows() if row["Delete"]]
@@ -160,20 +220,47 @@ def add_patient_form():
         insurance_provider = st.text_input("Insurance Provider")
         submit = st.form_submit_button("Add Patient")
         if submit:
-            insert_patient_data(first_name, last_name, age, gender, height, weight, allergies, address, insurance_provider)
-    
+            record = (first_name, last_name, age, gender, height, weight, allergies, address, insurance_provider)
+            candidates = find_duplicate_candidates(first_name, last_name, age, address)
+            if candidates:
+                st.session_state["pending_patient"] = record
+                st.session_state["duplicate_candidates"] = candidates
+            else:
+                insert_patient_data(*record)
+
+    # Possible duplicates are shown before anything is written
+    if "pending_patient" in st.session_state:
+        st.warning("Possible existing records for this patient:")
+        display_patient_data(st.session_state["duplicate_candidates"])
+        add_col, cancel_col = st.columns(2)
+        if add_col.button("Add Anyway"):
+            insert_patient_data(*st.session_state.pop("pending_patient"))
+            st.session_state.pop("duplicate_candidates", None)
+        elif cancel_col.button("Cancel"):
+            st.session_state.pop("pending_patient", None)
+            st.session_state.pop("duplicate_candidates", None)
+            st.rerun()
 
 
+def fetch_patients_by_name(search_term):
+    response = supabase.table("patients") \
+        .select("*") \
+        .or_(f"patient_first_name.ilike.%{search_term}%,patient_last_name.ilike.%{search_term}%") \
+        .execute()
+    return response.data
+
 # 🔍 Search patients
 def search_patients():
     st.subheader("Search Patients")
     search_term = st.text_input("Enter patient's first or last name:")
     if search_term:
-        response = supabase.table("patients") \
-            .select("*") \
-            .or_(f"patient_first_name.ilike.%{search_term}%,patient_last_name.ilike.%{search_term}%") \
-            .execute()
-        search_results = response.data
+        # Interactive lookups run on the shared pool ahead of any queued report jobs
+        try:
+            search_results = report_jobs.run_interactive(("patient_search_all", search_term),
+                                                         fetch_patients_by_name, search_term)
+        except TimeoutError:
+            st.warning("Patient search is taking too long. Please try again in a moment.")
+            return
         if search_results:
             st.write("Search Results:")
             display_patient_data_with_delete(search_results)
@@ -185,11 +272,122 @@ def search_patients():
 # 📂 Patient profile view (all data)
 def patient_profile():
     st.subheader("Patient Profile")
-    data = fetch_patient_data()
+    import pandas as pd
+    # One copy of the full patient list per process, shared read-only by sessions
+    data = shared_frames.shared("patients_with_stats", lambda: pd.DataFrame(fetch_patient_data_with_stats()))
     display_patient_data(data)
 
+# 🗓️ Patient visit timeline, loaded newest first in fixed-size windows
+TIMELINE_WINDOW = 10
+MAX_CACHED_TIMELINES = 10
+
+def load_timeline_window(patient_id):
+    timelines = st.session_state.setdefault("timelines", {})
+    timeline = timelines.get(patient_id)
+    if timeline is None:
+        if len(timelines) >= MAX_CACHED_TIMELINES:
+            timelines.pop(next(iter(timelines)))
+        timeline = timelines[patient_id] = {"visits": [], "complete": False, "live_exhausted": False}
+
+    last = timeline["visits"][-1] if timeline["visits"] else None
+    window = []
+    if not timeline["live_exhausted"]:
+        window = data_access.get_patient_timeline(
+            supabase, patient_id,
+            before_date=last["visit_date"] if last else None,
+            before_visit_id=last["visit_id"] if last else None,
+            limit=TIMELINE_WINDOW
+        )
+        timeline["live_exhausted"] = len(window) < TIMELINE_WINDOW
+    if timeline["live_exhausted"]:
+        # Visits older than the archive horizon continue from the Parquet archive
+        cursor = window[-1] if window else last
+        window += load_archived_visits(timeline, patient_id, cursor, TIMELINE_WINDOW - len(window))
+    timeline["visits"].extend(window)
+    timeline["complete"] = len(window) < TIMELINE_WINDOW
+
+ARCHIVED_TIMELINE_COLUMNS = ["visit_id", "record_id", "patient_id", "admission_type", "room_number", "doctor_id",
+                             "symptoms", "diagnosis_notes", "prescription", "payment_amount"]
+
+def load_archived_visits(timeline, patient_id, last, limit):
+    """
+    Next `limit` archived visits of the patient older than `last`, shaped like
+    timeline rows. Rows read beyond the window stay buffered on the timeline with
+    the month to continue from, so each window only opens the files it still needs.
+    """
+    if "archive_rows" not in timeline:
+        start_month = date.fromisoformat(str(last["visit_date"])).replace(day=1) if last else None
+        timeline.update(archive_rows=[], archive_month=start_month, archive_exhausted=False)
+
+    rows = timeline["archive_rows"]
+    while len(rows) < limit and not timeline["archive_exhausted"]:
+        frame, next_month = visit_archive.read_patient_visits(patient_id, ARCHIVED_TIMELINE_COLUMNS,
+                                                              through_month=timeline["archive_month"],
+                                                              min_rows=limit - len(rows))
+        frame = frame.astype({"visit_date": str})
+        if last:
+            before = str(last["visit_date"])
+            frame = frame[(frame["visit_date"] < before) |
+                          ((frame["visit_date"] == before) & (frame["visit_id"] < last["visit_id"]))]
+        rows.extend(frame.astype(object).where(frame.notna(), None).to_dict("records"))
+        timeline["archive_month"] = next_month
+        timeline["archive_exhausted"] = next_month is None
+    window, timeline["archive_rows"] = rows[:limit], rows[limit:]
+
+    doctors = {doctor["doctor_id"]: doctor for doctor in dimension_cache.get_doctors(supabase)}
+    visits = []
+    for row in window:
+        doctor = doctors.get(row.pop("doctor_id"), {})
+        row.update(doctor_name=doctor.get("doctor_name"), doctor_department=doctor.get("doctor_department"),
+                   archived=True)
+        visits.append(row)
+    return visits
+
+def patient_timeline():
+    st.subheader("Patient Timeline")
+    name = st.text_input("Search patient by first or last name:")
+    if len(name.strip()) < 2:
+        return
+    try:
+        patients = report_jobs.run_interactive(("patient_search", name, 20), data_access.search_patients,
+                                               supabase, name, 20)
+    except TimeoutError:
+        st.warning("Patient search is taking too long. Please try again in a moment.")
+        return
+    if not patients:
+        st.write("No matching patients found.")
+        return
+
+    labels = {f"{p['patient_id']} - {p['patient_first_name']} {p['patient_last_name']}": p["patient_id"] for p in patients}
+    patient_id = labels[st.selectbox("Patient", list(labels))]
+
+    timelines = st.session_state.setdefault("timelines", {})
+    if st.button("Refresh"):
+        timelines.pop(patient_id, None)
+    if patient_id not in timelines:
+        load_timeline_window(patient_id)
+
+    timeline = timelines[patient_id]
+    if not timeline["visits"]:
+        st.info("No visits recorded for this patient.")
+        return
+
+    for visit in timeline["visits"]:
+        archived = " · Archived" if visit.get("archived") else ""
+        with st.expander(f"{visit['visit_date']} · {visit['admission_type']} · {visit['doctor_name']} ({visit['doctor_department']}){archived}"):
+            st.write(f"**Record ID:** {visit['record_id']}")
+            st.write(f"**Room:** {visit['room_number']}")
+            st.write(f"**Symptoms:** {visit['symptoms']}")
+            st.write(f"**Diagnosis Notes:** {visit['diagnosis_notes']}")
+            st.write(f"**Prescription:** {visit['prescription']}")
+            st.write(f"**Payment:** ${visit['payment_amount'] or 0:,.2f}")
+
+    if not timeline["complete"] and st.button("Load Older Visits"):
+        load_timeline_window(patient_id)
+        st.rerun()
+
 # 📌 Sidebar navigation
-page_selection = st.sidebar.radio("Navigation", ["Search Patients", "Add Patient", "Patient Profile"])
+page_selection = st.sidebar.radio("Navigation", ["Search Patients", "Add Patient", "Patient Profile", "Patient Timeline"])
 
 if page_selection == "Search Patients":
     search_patients()
@@ -197,3 +395,5 @@ elif page_selection == "Add Patient":
     add_patient_form()
 elif page_selection == "Patient Profile":
     patient_profile()
+elif page_selection == "Patient Timeline":
+    patient_timeline()
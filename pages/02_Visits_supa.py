@@ -2,6 +2,12 @@ import streamlit as st
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import os
+import time
+from datetime import timedelta
+import data_access
+import dimension_cache
+import report_jobs
+import write_journal
 
 
 # 🌐 Load Supabase credentials from .env
@@ -75,65 +81,166 @@ st.markdown(get_gradient_style(), unsafe_allow_html=True)
 st.markdown(force_light_theme_style(), unsafe_allow_html=True)
 st.title("Enter Visit Details")
 
-# 🔍 Get patients by name
-def get_patients_by_name(name):
-    response = supabase.table("patients") \
-        .select("patient_id, patient_first_name, patient_last_name") \
-        .or_(f"patient_first_name.ilike.%{name}%,patient_last_name.ilike.%{name}%") \
-        .execute()
-    return response.data if response.data else []
+# ⌨️ Typeahead limits for the patient picker
+MIN_SEARCH_LENGTH = 2
+MAX_SEARCH_RESULTS = 20
+MAX_CACHED_SEARCHES = 20
+SEARCH_CACHE_TTL = 30  # seconds; patients added by other sessions show up after this
+
+# 🔍 Get patients by name (top-k only)
+def get_patients_by_name(name, limit=MAX_SEARCH_RESULTS):
+    # Runs on the shared pool ahead of any queued report jobs
+    return report_jobs.run_interactive(("patient_search", name, limit), data_access.search_patients,
+                                       supabase, name, limit)
+
+# 🔁 Typeahead search that reuses earlier results while the user keeps typing
+def search_patients_typeahead(term):
+    term = term.strip()
+    if len(term) < MIN_SEARCH_LENGTH:
+        return []
+
+    # Cleared by the Patients page whenever this session adds or deletes a patient
+    cache = st.session_state.setdefault("patient_search_cache", {})
+    now = time.monotonic()
+    for stale in [key for key, entry in cache.items() if now - entry["fetched_at"] > SEARCH_CACHE_TTL]:
+        del cache[stale]
+    if term in cache:
+        return cache[term]["results"]
+
+    # A complete result set for a shorter term already contains every match for this one
+    lowered = term.lower()
+    fetched_at = now
+    for previous, entry in cache.items():
+        if entry["complete"] and previous.lower() in lowered:
+            results = [p for p in entry["results"]
+                       if lowered in p["patient_first_name"].lower() or lowered in p["patient_last_name"].lower()]
+            complete = True
+            fetched_at = entry["fetched_at"]
+            break
+    else:
+        try:
+            results = get_patients_by_name(term)
+        except TimeoutError:
+            st.warning("Patient search is taking too long. Please try again in a moment.")
+            return []
+        complete = len(results) < MAX_SEARCH_RESULTS
+
+    if len(cache) >= MAX_CACHED_SEARCHES:
+        cache.pop(next(iter(cache)))
+    cache[term] = {"results": results, "complete": complete, "fetched_at": fetched_at}
+    return results
 
 # 👨‍⚕️ Get list of doctors
 def get_doctors():
-    response = supabase.table("doctors").select("doctor_id, doctor_name").execute()
-    return response.data if response.data else []
+    return dimension_cache.get_doctors(supabase)
+
 
+# 🛏️ Rooms free for the whole stay window
+def get_free_rooms(start_date, end_date):
+    try:
+        response = supabase.rpc("find_free_rooms", {
+            "p_start": str(start_date),
+            "p_end": str(end_date)
+        }).execute()
+        return [row["room_number"] for row in response.data or []]
+    except Exception as e:
+        st.warning(f"Could not check room availability: {e}")
+        return []
 
 # 📥 Insert visit details
 def insert_visit_details(patient_id, admission_type, visit_date, room_number,
                          doctor_id, symptoms, tests, diagnosis_notes, prescription,
-                         payment_amount, payment_method, payment_invoice_number):
+                         payment_amount, payment_method, payment_invoice_number, discharge_date=None):
+    visit = {
+        "patient_id": patient_id,
+        "admission_type": admission_type,
+        "visit_date": str(visit_date),
+        "room_number": room_number,
+        "doctor_id": doctor_id,
+        "symptoms": symptoms,
+        "tests": tests,
+        "diagnosis_notes": diagnosis_notes,
+        "prescription": prescription,
+        "payment_amount": payment_amount,
+        "payment_method": payment_method,
+        "payment_invoice_number": payment_invoice_number
+    }
+    if write_journal.enabled():
+        write_journal.record_insert(supabase, "visits", visit)
+        st.success("Visit details saved and queued for sync.")
+        return None
+
     try:
-        response = supabase.table("visits").insert({
-            "patient_id": patient_id,
-            "admission_type": admission_type,
-            "visit_date": str(visit_date),
-            "room_number": room_number,
-            "doctor_id": doctor_id,
-            "symptoms": symptoms,
-            "tests": tests,
-            "diagnosis_notes": diagnosis_notes,
-            "prescription": prescription,
-            "payment_amount": payment_amount,
-            "payment_method": payment_method,
-            "payment_invoice_number": payment_invoice_number
-        }).execute()
+        # Inpatient rooms are booked in the same transaction as the visit
+        if discharge_date:
+            inserted = data_access.insert_visit_with_room(supabase, visit, discharge_date)
+        else:
+            inserted = data_access.insert_visits(supabase, [visit])
 
-        if response.data:
+        if inserted:
             st.success("Visit details inserted successfully!")
-            st.info(f"Record ID: {response.data[0]['record_id']}")
+            st.info(f"Record ID: {inserted[0]['record_id']}")
+            if discharge_date:
+                st.info(f"Room {room_number} booked until {discharge_date}.")
+            return inserted[0]
         else:
             st.warning("Insertion completed but returned no data.")
     except Exception as e:
-        st.error(f"Error inserting visit: {e}")
+        if "23P01" in str(e):
+            st.error(f"Room {room_number} was booked by someone else for part of this stay. The visit was not saved.")
+        else:
+            st.error(f"Error inserting visit: {e}")
+    return None
 
 
 
 # 🧾 Main input form
 def main():
+    if write_journal.enabled():
+        write_journal.show_status_sidebar(supabase)
+
     name = st.text_input("Search Patient by First or Last Name")
-    patients = get_patients_by_name(name)
-    patient_options = [f"{p['patient_id']} - {p['patient_first_name']} {p['patient_last_name']}" for p in patients]
+    patients = search_patients_typeahead(name)
 
-    if not patients:
-        st.warning("No patients found. Please add a new patient first.")
+    # Already-selected patients stay as options, so they never need re-querying
+    selected_labels = st.session_state.get("selected_patients", [])
+    patient_options = list(dict.fromkeys(selected_labels + [
+        f"{p['patient_id']} - {p['patient_first_name']} {p['patient_last_name']}" for p in patients
+    ]))
+
+    if not patient_options:
+        if len(name.strip()) < MIN_SEARCH_LENGTH:
+            st.info(f"Type at least {MIN_SEARCH_LENGTH} characters to search for a patient.")
+        else:
+            st.warning("No patients found. Please add a new patient first.")
     else:
-        selected_patient_options = st.multiselect("Select Patient", patient_options, [])
+        if len(patients) >= MAX_SEARCH_RESULTS:
+            st.caption(f"Showing the first {MAX_SEARCH_RESULTS} matches. Keep typing to narrow the search.")
+        selected_patient_options = st.multiselect("Select Patient", patient_options, key="selected_patients")
         selected_patient_ids = [int(option.split(" - ")[0]) for option in selected_patient_options]
 
         admission_type = st.selectbox("Admission Type", ["Inpatient", "Outpatient"])
         visit_date = st.date_input("Visit Date")
-        room_number = st.text_input("Room Number")
+
+        # Inpatients can only be given a room that is free for the whole stay
+        discharge_date = None
+        if admission_type == "Inpatient":
+            if write_journal.enabled():
+                st.error("Inpatient admissions need a live connection to book a room and cannot be journaled.")
+                return
+            if len(selected_patient_ids) > 1:
+                st.error("A room can only be booked for one patient. Select a single patient for an inpatient admission.")
+                return
+            discharge_date = st.date_input("Expected Discharge Date",
+                                           value=visit_date + timedelta(days=1),
+                                           min_value=visit_date + timedelta(days=1))
+            free_rooms = get_free_rooms(visit_date, discharge_date)
+            if not free_rooms:
+                st.error("No rooms are free for this stay.")
+                return
+            room_number = st.selectbox("Room Number", free_rooms)
+        else:
+            room_number = st.text_input("Room Number")
 
         doctors = get_doctors()
         if not doctors:
@@ -158,7 +265,8 @@ def main():
                     insert_visit_details(
                         patient_id, admission_type, visit_date, room_number,
                         selected_doctor_id, symptoms, tests, diagnosis_notes,
-                        prescription, payment_amount, payment_method, payment_invoice_number
+                        prescription, payment_amount, payment_method, payment_invoice_number,
+                        discharge_date
                     )
             else:
                 st.warning("Please select at least one patient before submitting.")
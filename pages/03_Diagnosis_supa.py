@@ -2,6 +2,8 @@ import streamlit as st
 from dotenv import load_dotenv
 from supabase import create_client, Client
 import os
+import data_access
+import write_journal
 
 
 # 🔐 Load credentials from .env
@@ -75,53 +77,35 @@ st.markdown(get_gradient_style(), unsafe_allow_html=True)
 st.markdown(force_light_theme_style(), unsafe_allow_html=True)
 st.title("Modify Specific Records") 
 
+if write_journal.enabled():
+    write_journal.show_status_sidebar(supabase)
+
 
 # 🔍 Get visit details by record_id with patient and doctor names
 def get_visit_details_by_record_id(record_id):
     try:
-        # 1. Get visit row
-        visit_resp = supabase.table("visits").select("*").eq("record_id", record_id).limit(1).execute()
-        if not visit_resp.data:
-            return None
-        visit = visit_resp.data[0]
-
-        # 2. Get patient info
-        patient_resp = supabase.table("patients").select("patient_first_name, patient_last_name") \
-            .eq("patient_id", visit["patient_id"]).limit(1).execute()
-        patient = patient_resp.data[0] if patient_resp.data else {}
-
-        # 3. Get doctor info
-        doctor_resp = supabase.table("doctors").select("doctor_name") \
-            .eq("doctor_id", visit["doctor_id"]).limit(1).execute()
-        doctor = doctor_resp.data[0] if doctor_resp.data else {}
-
-        # 4. Combine all into one dictionary
-        return {
-            "record_id": visit["record_id"],
-            "patient_first_name": patient.get("patient_first_name", ""),
-            "patient_last_name": patient.get("patient_last_name", ""),
-            "doctor_name": doctor.get("doctor_name", ""),
-            "symptoms": visit["symptoms"],
-            "tests": visit["tests"],
-            "diagnosis_notes": visit["diagnosis_notes"],
-            "prescription": visit["prescription"]
-        }
-
+        return data_access.get_visit_details(supabase, record_id)
     except Exception as e:
         st.error(f"❌ Error retrieving data: {e}")
         return None
 
 # 📝 Update specific visit fields
 def update_specific_visit_details(record_id, symptoms, tests, diagnosis_notes, prescription):
+    changes = {
+        "symptoms": symptoms,
+        "tests": tests,
+        "diagnosis_notes": diagnosis_notes,
+        "prescription": prescription
+    }
+    if write_journal.enabled():
+        write_journal.record_update(supabase, "visits", changes, "record_id", record_id)
+        st.success("✅ Visit update saved and queued for sync.")
+        return
+
     try:
-        result = supabase.table("visits").update({
-            "symptoms": symptoms,
-            "tests": tests,
-            "diagnosis_notes": diagnosis_notes,
-            "prescription": prescription
-        }).eq("record_id", record_id).execute()
-
-        if result.data:
+        updated = data_access.update_visit(supabase, record_id, changes)
+
+        if updated:
             st.success("✅ Visit details updated successfully!")
         else:
             st.warning("No data was updated.")
@@ -131,9 +115,41 @@ def update_specific_visit_details(record_id, symptoms, tests, diagnosis_notes, p
 
 
 
+# 🔎 Clinical search with ranked, highlighted, paginated results
+SEARCH_PAGE_SIZE = 10
+
+def open_record(record_id):
+    st.session_state["record_id"] = str(record_id)
+
+def clinical_search():
+    st.subheader("Search Clinical Notes")
+    query = st.text_input("Search symptoms, tests, diagnosis notes or prescriptions")
+    if not query.strip():
+        return
+
+    page = st.number_input("Page", min_value=1, value=1, step=1)
+    try:
+        results = data_access.search_visits(supabase, query, SEARCH_PAGE_SIZE, (page - 1) * SEARCH_PAGE_SIZE)
+    except Exception as e:
+        st.error(f"❌ Error searching visits: {e}")
+        return
+
+    if not results:
+        st.info("No matching visits.")
+        return
+
+    for visit in results:
+        st.markdown(f"**Record {visit['record_id']}** · {visit['visit_date']} · "
+                    f"{visit['patient_first_name']} {visit['patient_last_name']} · {visit['doctor_name']}")
+        st.markdown(visit["snippet"])
+        st.button("Open", key=f"open_{visit['record_id']}", on_click=open_record, args=(visit["record_id"],))
+    st.write("---")
+
+
 # 🔁 Main UI
 def modify_specific_records():
-    record_id = st.text_input("Enter Visit Record ID")
+    clinical_search()
+    record_id = st.text_input("Enter Visit Record ID", key="record_id")
 
     if record_id:
         visit = get_visit_details_by_record_id(record_id)
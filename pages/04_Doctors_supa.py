@@ -1,8 +1,9 @@
 import streamlit as st
-import pandas as pd
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import os
+import dimension_cache
+import write_journal
 
 # Load .env credentials
 load_dotenv()
@@ -78,6 +79,8 @@ st.markdown(force_light_theme_style(), unsafe_allow_html=True)
 
 def doctors_page():
     st.title("Doctors Page")
+    if write_journal.enabled():
+        write_journal.show_status_sidebar(supabase)
 
     st.header("Add New Doctor")
     doctor_name = st.text_input("Doctor Name")
@@ -123,41 +126,60 @@ def doctors_page():
             st.warning("No doctors selected for deletion.")
 
 
+# Doctor columns plus the visit counters kept in doctor_stats
+DOCTOR_COLUMNS = "*, doctor_stats(visit_count, total_billing)"
+
+
+def with_doctor_stats(rows):
+    import pandas as pd
+    for row in rows:
+        stats = row.pop("doctor_stats", None) or {}
+        if isinstance(stats, list):
+            stats = stats[0] if stats else {}
+        row["visit_count"] = stats.get("visit_count", 0)
+        row["total_billing"] = stats.get("total_billing", 0)
+    return pd.DataFrame(rows)
+
+
 def search_doctors_by_name(name):
     response = supabase.table("doctors") \
-        .select("*") \
+        .select(DOCTOR_COLUMNS) \
         .ilike("doctor_name", f"%{name}%") \
         .execute()
-    return pd.DataFrame(response.data)
+    return with_doctor_stats(response.data)
 
 
 def search_doctors_by_department(department):
     response = supabase.table("doctors") \
-        .select("*") \
+        .select(DOCTOR_COLUMNS) \
         .eq("doctor_department", department) \
         .execute()
-    return pd.DataFrame(response.data)
+    return with_doctor_stats(response.data)
 
 
 def get_departments():
-    response = supabase.table("doctors").select("doctor_department").execute()
-    df = pd.DataFrame(response.data)
-    if "doctor_department" in df.columns:
-        return sorted(df["doctor_department"].dropna().unique().tolist())
-    else:
+    departments = dimension_cache.get_departments(supabase)
+    if not departments:
         st.warning("No department data found.")
-        return []
+    return departments
 
 
 
 
 def add_new_doctor(name, specialty, department):
+    doctor = {
+        "doctor_name": name,
+        "doctor_specialty": specialty,
+        "doctor_department": department
+    }
+    if write_journal.enabled():
+        write_journal.record_insert(supabase, "doctors", doctor)
+        st.success("Doctor saved and queued for sync.")
+        return
+
     try:
-        supabase.table("doctors").insert({
-            "doctor_name": name,
-            "doctor_specialty": specialty,
-            "doctor_department": department
-        }).execute()
+        supabase.table("doctors").insert(doctor).execute()
+        dimension_cache.invalidate()
         st.success("Doctor added successfully!")
     except Exception as e:
         st.error(f"Failed to add doctor. Error: {e}")
@@ -187,6 +209,8 @@ def delete_doctor_and_update_visits(doctor_ids):
             # Delete doctor record
             supabase.table("doctors").delete().eq("doctor_id", doc_id).execute()
 
+        dimension_cache.invalidate()
+
     except Exception as e:
         st.error(f"Failed to delete doctor and update visits. Error: {e}")
 
@@ -1,10 +1,13 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 from dotenv import load_dotenv
 from supabase import create_client, Client
 import os
+from datetime import date, timedelta
+import report_jobs
+import shared_frames
+import single_flight
+import visit_archive
 
 # Load Supabase credentials
 load_dotenv()
@@ -80,51 +83,129 @@ st.markdown(force_light_theme_style(), unsafe_allow_html=True)
 # -----------------------------
 # Supabase Query Helpers
 # -----------------------------
-def fetch_data(table, columns="*", filters=None):
+def _fetch_data(table, columns, filters, date_range):
     query = supabase.table(table).select(columns)
     if filters:
         for condition in filters:
             query = query.eq(condition[0], condition[1])
+    # Plain bounds on visit_date let Postgres prune visit partitions
+    if date_range:
+        query = query.gte("visit_date", str(date_range[0])).lte("visit_date", str(date_range[1]))
     return query.execute().data
 
+# Identical concurrent queries share one request (results are read-only)
+def fetch_data(table, columns="*", filters=None, date_range=None):
+    filters = tuple(tuple(condition) for condition in filters or ())
+    date_range = tuple(date_range) if date_range else None
+    key = ("fetch_data", table, columns, filters, date_range)
+    return single_flight.do(key, _fetch_data, table, columns, filters, date_range)
+
 def fetch_custom_query(table, query_string):
-    return supabase.table(table).select(query_string).execute().data
+    return fetch_data(table, query_string)
+
+def _load_visit_history(columns):
+    hot = pd.DataFrame(fetch_data("visits", ", ".join(columns)))
+    cold = visit_archive.read_archive(columns)[columns]
+    if cold.empty:
+        return hot
+    if "visit_id" in columns and not hot.empty:
+        # A visit archived but not yet deleted is still live; count it once
+        cold = cold[~cold["visit_id"].isin(hot["visit_id"])]
+    if "visit_date" in columns:
+        cold["visit_date"] = cold["visit_date"].astype(str)
+    return pd.concat([hot, cold], ignore_index=True)
+
+# Live visits from the database plus history moved to the local archive,
+# held once per process and shared read-only by every session
+def fetch_visit_history(columns):
+    return shared_frames.shared(("visit_history", tuple(columns)), lambda: _load_visit_history(columns))
+
+# -----------------------------
+# Background Report Jobs
+# -----------------------------
+def run_report(key, compute, label, *args):
+    """
+    Runs a report computation on the shared worker pool and shows its progress.
+    Finished results are reused by every session until they expire.
+    """
+    job = report_jobs.submit(key, compute, *args)
+    if not job.done:
+        bar = st.progress(job.progress, text=label)
+        while not job.wait(0.25):
+            bar.progress(job.progress, text=label)
+        bar.empty()
+    if job.error is not None:
+        st.error(f"{label} failed: {job.error}")
+        return None
+    return job.result
+
+def compute_billing_by_department(job):
+    v_df = fetch_visit_history(["doctor_id", "payment_amount"])
+    job.set_progress(0.5)
+    d_df = pd.DataFrame(fetch_data("doctors", "doctor_id, doctor_department"))
+    job.set_progress(0.8)
+
+    if v_df.empty or d_df.empty:
+        return None
+
+    merged = pd.merge(v_df, d_df, on="doctor_id", how="inner")
+    grouped = merged.groupby("doctor_department")["payment_amount"].sum().reset_index()
+    return grouped.sort_values("payment_amount", ascending=False).head(5)
+
+def compute_invoice_viz(job):
+    df = fetch_visit_history(["patient_id", "visit_date", "payment_amount", "payment_method"])
+    job.set_progress(0.7)
+    if df.empty:
+        return None
+
+    df["visit_date"] = pd.to_datetime(df["visit_date"])
+    return {
+        "revenue_over_time": df.groupby("visit_date")["payment_amount"].sum(),
+        "payment_methods": df["payment_method"].value_counts()
+    }
+
+def compute_patient_age_distribution(job):
+    data = fetch_data("patients", "age")
+    job.set_progress(0.7)
+    df = pd.DataFrame(data)
+    if df.empty:
+        return None
+    return df
+
+def compute_server_report(job, function_name, params):
+    return single_flight.do((function_name, params), lambda: supabase.rpc(function_name, dict(params)).execute().data)
 
 # -----------------------------
 # Display Functions
 # -----------------------------
 
+# Plotting libraries are slow to import, so only views that draw charts load them
+def load_plotting():
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    return plt, sns
+
 def display_invoices():
-    data = fetch_data("visits", "patient_id, visit_id, visit_date, room_number, tests, payment_amount, payment_method")
-    df = pd.DataFrame(data)
+    columns = "patient_id, visit_id, visit_date, room_number, tests, payment_amount, payment_method"
+    df = shared_frames.shared(("invoices", columns), lambda: pd.DataFrame(fetch_data("visits", columns)))
     st.write("Invoice Data:", df)
     revenue()
 
 def revenue():  
     st.title("System Revenue")
-    data = fetch_data("visits", "payment_amount")
-    df = pd.DataFrame(data)
+    df = fetch_visit_history(["payment_amount"])
     total = df["payment_amount"].sum() if not df.empty else 0.0
     st.write(f"Total Revenue: ${total:,.2f}")
 
 
 
 def display_highest_billing_department():
-    # Manual join
-    visits = fetch_data("visits", "doctor_id, payment_amount")
-    doctors = fetch_data("doctors", "doctor_id, doctor_department")
-
-    if not visits or not doctors:
+    plt, sns = load_plotting()
+    top5 = run_report("billing_by_department", compute_billing_by_department, "Ranking departments by billing")
+    if top5 is None:
         st.warning("Missing doctor or visit data.")
         return
 
-    v_df = pd.DataFrame(visits)
-    d_df = pd.DataFrame(doctors)
-
-    merged = pd.merge(v_df, d_df, on="doctor_id", how="inner")
-    grouped = merged.groupby("doctor_department")["payment_amount"].sum().reset_index()
-    top5 = grouped.sort_values("payment_amount", ascending=False).head(5)
-
     st.write("Highest Billing Department:")
     st.dataframe(top5)
 
@@ -139,23 +220,26 @@ def display_highest_billing_department():
 def filter_and_search():
     st.subheader("Filter and Search Invoices")
     invoice_status = st.selectbox("Select Payment Type:", ["Credit Card", "Insurance", "Cash", "Debit Card", "Medicare"])
-    data = fetch_data("visits", "patient_id, visit_id, visit_date, room_number, tests, payment_amount", filters=[("payment_method", invoice_status)])
+    col1, col2 = st.columns(2)
+    start_date = col1.date_input("From", value=date.today() - timedelta(days=365))
+    end_date = col2.date_input("To", value=date.today())
+    data = fetch_data("visits", "patient_id, visit_id, visit_date, room_number, tests, payment_amount",
+                      filters=[("payment_method", invoice_status)], date_range=(start_date, end_date))
     df = pd.DataFrame(data)
     st.write("Filtered Invoices:", df)
 
 
 
 def invoice_viz():
-    data = fetch_data("visits", "patient_id, visit_date, payment_amount, payment_method")
-    df = pd.DataFrame(data)
+    plt, sns = load_plotting()
+    report = run_report("invoice_viz", compute_invoice_viz, "Computing revenue over time")
 
-    if df.empty:
+    if report is None:
         st.warning("No invoice data available.")
         return
 
     st.subheader("Total Revenue Over Time")
-    df["visit_date"] = pd.to_datetime(df["visit_date"])
-    revenue_over_time = df.groupby("visit_date")["payment_amount"].sum()
+    revenue_over_time = report["revenue_over_time"]
 
     fig, ax = plt.subplots(figsize=(10, 6))
     sns.lineplot(x=revenue_over_time.index, y=revenue_over_time.values, ax=ax)
@@ -166,7 +250,7 @@ def invoice_viz():
 
     st.subheader("Distribution of Invoices by Payment Method")
     fig2, ax2 = plt.subplots(figsize=(8, 6))
-    df["payment_method"].value_counts().plot(kind="bar", ax=ax2)
+    report["payment_methods"].plot(kind="bar", ax=ax2)
     ax2.set_xlabel("Payment Method")
     ax2.set_ylabel("Number of Invoices")
     ax2.set_title("Distribution of Invoices by Payment Method")
@@ -175,8 +259,8 @@ def invoice_viz():
 
 
 def display_common_admission_types():
-    data = fetch_data("visits", "admission_type")
-    df = pd.DataFrame(data)
+    plt, sns = load_plotting()
+    df = fetch_visit_history(["admission_type"])
     if df.empty:
         st.warning("No admission data.")
         return
@@ -194,10 +278,10 @@ def display_common_admission_types():
 
 
 def display_patient_age_distribution():
-    data = fetch_data("patients", "age")
-    df = pd.DataFrame(data)
+    plt, sns = load_plotting()
+    df = run_report("patient_age_distribution", compute_patient_age_distribution, "Computing patient ages")
 
-    if df.empty:
+    if df is None:
         st.warning("No patient age data available.")
         return
 
@@ -215,6 +299,7 @@ def display_patient_age_distribution():
 
 
 def display_most_used_insurance_providers():
+    plt, sns = load_plotting()
     data = fetch_data("patients", "insurance_provider")
     df = pd.DataFrame(data)
     df = df[df["insurance_provider"].notnull()]
@@ -238,12 +323,140 @@ def display_most_used_insurance_providers():
 
 
 
+def display_reports():
+    st.subheader("Reports")
+    report = st.selectbox("Report", ["Visit Count per Patient", "Patients Over Payment Threshold", "Billing per Doctor"])
+
+    col1, col2, col3 = st.columns(3)
+    start_date = col1.date_input("From", value=None)
+    end_date = col2.date_input("To", value=None)
+    top_k = col3.number_input("Top", min_value=1, max_value=100, value=10, step=1)
+
+    params = {
+        "p_start": str(start_date) if start_date else None,
+        "p_end": str(end_date) if end_date else None,
+        "p_limit": int(top_k)
+    }
+    if report == "Visit Count per Patient":
+        function_name = "report_patient_visit_counts"
+    elif report == "Patients Over Payment Threshold":
+        function_name = "report_patients_over_payment"
+        params["p_min_total"] = st.number_input("Minimum Total Payment", min_value=0.0, value=500.0)
+    else:
+        function_name = "report_doctor_billing"
+
+    # Results are cached per report and parameter set
+    params = tuple(sorted(params.items()))
+    rows = run_report((function_name, params), compute_server_report, report, function_name, params)
+    if rows:
+        st.dataframe(pd.DataFrame(rows))
+    elif rows is not None:
+        st.info("No rows match these parameters.")
+
+
+# -----------------------------
+# Remittance Reconciliation
+# -----------------------------
+REMITTANCE_CHUNK_SIZE = 5000
+
+def fetch_invoice_matches(invoice_numbers):
+    rows = supabase.rpc("match_remittance_invoices", {"p_invoices": invoice_numbers}).execute().data
+    visits = pd.DataFrame(rows or [], columns=["visit_id", "payment_invoice_number", "payment_amount"])
+    visits["payment_amount"] = pd.to_numeric(visits["payment_amount"])
+    return visits.groupby("payment_invoice_number").agg(
+        visit_id=("visit_id", "first"),
+        billed_amount=("payment_amount", "sum"),
+        visit_matches=("visit_id", "size")
+    )
+
+def parse_amounts(values):
+    """
+    Parses remittance amounts written as plain numbers or with currency
+    formatting ("$1,234.00", "(12.50)" for negatives). Anything else is NaN.
+    """
+    text = values.astype("string").str.strip()
+    negative = text.str.startswith("(") & text.str.endswith(")")
+    text = text.str.strip("()").str.replace(r"[$,\s]", "", regex=True)
+    amounts = pd.to_numeric(text, errors="coerce").astype(float)
+    return amounts.mask(negative, -amounts)
+
+def reconcile_remittance(upload, invoice_column, amount_column):
+    """
+    Streams a remittance CSV in chunks and hash-joins each chunk against the
+    visits that carry its invoice numbers, fetched in one indexed lookup per chunk.
+    """
+    seen = set()
+    results = []
+    for chunk in pd.read_csv(upload, chunksize=REMITTANCE_CHUNK_SIZE, dtype={invoice_column: str, amount_column: str}, skipinitialspace=True):
+        lines = pd.DataFrame({
+            "invoice_number": chunk[invoice_column].str.strip().replace("", None),
+            "paid_amount": parse_amounts(chunk[amount_column])
+        })
+        matches = fetch_invoice_matches(lines["invoice_number"].dropna().unique().tolist())
+        lines = lines.merge(matches, left_on="invoice_number", right_index=True, how="left")
+        lines["visit_id"] = lines["visit_id"].astype("Int64")
+
+        # Lines without an invoice number are unmatched, never duplicates of each other
+        numbered = lines["invoice_number"].notna()
+        duplicate = numbered & (lines["invoice_number"].isin(seen) | lines["invoice_number"].duplicated() | (lines["visit_matches"] > 1))
+        status = pd.Series("Matched", index=lines.index)
+        status = status.mask(lines["paid_amount"] < lines["billed_amount"] - 0.005, "Underpaid")
+        status = status.mask(lines["paid_amount"].isna(), "Invalid Amount")
+        status = status.mask(lines["visit_id"].isna(), "Unmatched")
+        status = status.mask(duplicate, "Duplicate")
+        lines["status"] = status
+
+        seen.update(lines["invoice_number"].dropna())
+        results.append(lines.drop(columns=["visit_matches"]))
+
+    return pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+
+def display_reconciliation():
+    st.subheader("Payer Remittance Reconciliation")
+    upload = st.file_uploader("Remittance CSV", type="csv")
+    col1, col2 = st.columns(2)
+    invoice_column = col1.text_input("Invoice Number Column", value="invoice_number")
+    amount_column = col2.text_input("Paid Amount Column", value="paid_amount")
+
+    if upload and st.button("Reconcile"):
+        try:
+            results = reconcile_remittance(upload, invoice_column, amount_column)
+        except (KeyError, ValueError) as e:
+            st.error(f"Could not read remittance file: {e}")
+            return
+        # Kept within the session's memory budget so the results survive reruns
+        shared_frames.keep_private(st.session_state, "remittance_results", results)
+
+    results = shared_frames.get_private(st.session_state, "remittance_results")
+    if results is None:
+        return
+    if results.empty:
+        st.info("The remittance file has no lines.")
+        return
+
+    st.write("Reconciliation Summary:")
+    st.dataframe(results["status"].value_counts().rename_axis("Status").reset_index(name="Lines"))
+
+    flagged = results[results["status"] != "Matched"]
+    st.write("Lines Needing Review:", flagged)
+    st.download_button("Download Flagged Lines", flagged.to_csv(index=False), "remittance_flagged.csv", "text/csv")
+
+
+def show_memory_metrics():
+    usage = shared_frames.metrics(st.session_state)
+    st.sidebar.caption(
+        f"Shared frames: {usage['shared_frames']} ({usage['shared_bytes'] / 1e6:.1f} MB) | "
+        f"Session frames: {usage['private_frames']} "
+        f"({usage['private_bytes'] / 1e6:.1f} of {usage['private_budget_bytes'] / 1e6:.0f} MB)"
+    )
+
+
 # -----------------------------
 # Main Entry
 # -----------------------------
 def main():
     st.title("Invoices Dashboard")
-    nav = st.sidebar.radio("Navigation", ["Display Invoices", "Filter and Search", "Analysis"])
+    nav = st.sidebar.radio("Navigation", ["Display Invoices", "Filter and Search", "Analysis", "Reports", "Reconciliation"])
 
     if nav == "Display Invoices":
         display_invoices()
@@ -251,10 +464,19 @@ def main():
     elif nav == "Filter and Search":
         filter_and_search()
     elif nav == "Analysis":
+        # Queue both reports up front so they compute in parallel
+        report_jobs.submit("invoice_viz", compute_invoice_viz)
+        report_jobs.submit("patient_age_distribution", compute_patient_age_distribution)
         invoice_viz()
         display_common_admission_types()
         display_patient_age_distribution()
         display_most_used_insurance_providers()
+    elif nav == "Reports":
+        display_reports()
+    elif nav == "Reconciliation":
+        display_reconciliation()
+
+    show_memory_metrics()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,154 @@
+import itertools
+import os
+import queue
+import threading
+import time
+
+
+# ⚙️ Worker pool size and how long finished results are reused across sessions
+MAX_WORKERS = 2
+# Sized for the expected number of sessions searching at once; beyond that lookups run inline
+INTERACTIVE_WORKERS = int(os.getenv("INTERACTIVE_WORKERS", "8"))
+RESULT_TTL = 300
+INTERACTIVE_TIMEOUT = 10
+
+# Lower runs first: interactive lookups jump ahead of queued reports
+PRIORITY_INTERACTIVE = 0
+PRIORITY_REPORT = 10
+
+_queue = queue.PriorityQueue()
+_interactive_queue = queue.Queue()
+_jobs = {}
+_lock = threading.Lock()
+_sequence = itertools.count()
+_workers = []
+_idle_interactive = 0
+
+
+class Job:
+    """
+    A unit of background work. The job function receives the Job itself as its
+    first argument so it can report progress with set_progress().
+    """
+
+    def __init__(self, key, func, args, priority, ttl):
+        self.key = key
+        self.func = func
+        self.args = args
+        self.priority = priority
+        self.ttl = ttl
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.finished_at = None
+        self._claimed = False
+        self._done = threading.Event()
+
+    def set_progress(self, fraction):
+        self.progress = min(max(fraction, 0.0), 1.0)
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def _claim(self):
+        # Interactive jobs sit in two queues; whichever worker takes them first runs them
+        with _lock:
+            if self._claimed:
+                return False
+            self._claimed = True
+            return True
+
+    def _expired(self, now):
+        if not self.done:
+            return False
+        return self.error is not None or now - self.finished_at > self.ttl
+
+
+def _run(job):
+    try:
+        job.result = job.func(job, *job.args)
+    except Exception as e:
+        job.error = e
+    job.finished_at = time.monotonic()
+    job.progress = 1.0
+    job._done.set()
+
+
+def _worker():
+    while True:
+        _, _, job = _queue.get()
+        if job._claim():
+            _run(job)
+
+
+def _interactive_worker():
+    # Reserved for interactive lookups, so they never wait behind running reports
+    global _idle_interactive
+    while True:
+        with _lock:
+            _idle_interactive += 1
+        job = _interactive_queue.get()
+        with _lock:
+            _idle_interactive -= 1
+        if job._claim():
+            _run(job)
+
+
+def _ensure_workers():
+    while len(_workers) < INTERACTIVE_WORKERS:
+        thread = threading.Thread(target=_interactive_worker, name=f"interactive-worker-{len(_workers)}", daemon=True)
+        thread.start()
+        _workers.append(thread)
+    while len(_workers) < INTERACTIVE_WORKERS + MAX_WORKERS:
+        thread = threading.Thread(target=_worker, name=f"report-worker-{len(_workers)}", daemon=True)
+        thread.start()
+        _workers.append(thread)
+
+
+def _prune(now):
+    for key in [key for key, job in _jobs.items() if job._expired(now)]:
+        del _jobs[key]
+
+
+# 📨 Submit a job, or join the running / cached one with the same key
+def submit(key, func, *args, priority=PRIORITY_REPORT, ttl=RESULT_TTL):
+    with _lock:
+        _prune(time.monotonic())
+        job = _jobs.get(key)
+        if job is not None:
+            return job
+        job = Job(key, func, args, priority, ttl)
+        _jobs[key] = job
+        _ensure_workers()
+    _queue.put((priority, next(_sequence), job))
+    if priority == PRIORITY_INTERACTIVE:
+        _interactive_queue.put(job)
+    return job
+
+
+# ⚡ Run a lookup ahead of queued reports and wait for its result (not cached once done)
+def run_interactive(key, func, *args, timeout=INTERACTIVE_TIMEOUT):
+    job = submit(key, lambda job: func(*args), priority=PRIORITY_INTERACTIVE, ttl=0)
+    # With every interactive worker busy, run the lookup in the caller's thread rather
+    # than queue it behind other sessions' lookups
+    with _lock:
+        saturated = _interactive_queue.qsize() > _idle_interactive
+    if saturated and job._claim():
+        _run(job)
+    if not job.wait(timeout):
+        raise TimeoutError(f"Lookup {key!r} did not finish within {timeout}s.")
+    if job.error is not None:
+        raise job.error
+    return job.result
+
+
+# 🧹 Forget a cached result so the next submit recomputes it
+def invalidate(key):
+    with _lock:
+        job = _jobs.get(key)
+        if job is not None and job.done:
+            del _jobs[key]
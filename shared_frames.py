@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+
+import single_flight
+
+
+# 🧠 Reuse window for shared frames and each session's budget for private ones
+DEFAULT_TTL = 60
+SESSION_BUDGET_BYTES = int(os.getenv("SESSION_MEMORY_BUDGET_MB", "64")) * 1024 * 1024
+
+_lock = threading.Lock()
+_frames = {}
+_copy_on_write = False
+
+
+def _enable_copy_on_write():
+    """
+    Copy-on-write lets every session hold a cheap view of one shared frame:
+    any modification a session makes lands in its own copy, never in the
+    original. pandas is imported here, on first use, to keep page imports light.
+    """
+    global _copy_on_write
+    if not _copy_on_write:
+        import pandas as pd
+        if int(pd.__version__.split(".")[0]) < 3:
+            pd.set_option("mode.copy_on_write", True)
+        _copy_on_write = True
+
+
+def _nbytes(frame):
+    return int(frame.memory_usage(index=True, deep=True).sum())
+
+
+def shared(key, loader, ttl=DEFAULT_TTL):
+    """
+    Returns a read-only view of the process-wide frame for key, building it with
+    loader() at most once per ttl seconds however many sessions ask for it.
+    """
+    _enable_copy_on_write()
+    now = time.monotonic()
+    with _lock:
+        entry = _frames.get(key)
+    if entry is None or now - entry["loaded_at"] > ttl:
+        frame = single_flight.do(("shared_frame", key), loader)
+        entry = {"frame": frame, "loaded_at": now, "nbytes": _nbytes(frame)}
+        with _lock:
+            _frames[key] = entry
+    return entry["frame"].copy(deep=False)
+
+
+def invalidate(key):
+    with _lock:
+        _frames.pop(key, None)
+
+
+def keep_private(store, name, frame):
+    """
+    Keeps a session-specific frame in store (the session state) across reruns.
+    The least recently kept frames are dropped once the session exceeds its budget.
+    """
+    frames = store.setdefault("private_frames", {})
+    frames.pop(name, None)
+    frames[name] = {"frame": frame, "nbytes": _nbytes(frame)}
+    while len(frames) > 1 and sum(entry["nbytes"] for entry in frames.values()) > SESSION_BUDGET_BYTES:
+        frames.pop(next(iter(frames)))
+    return frame
+
+
+def get_private(store, name):
+    entry = store.get("private_frames", {}).get(name)
+    return entry["frame"] if entry else None
+
+
+# 📏 Shared versus private memory for the current process and session
+def metrics(store):
+    with _lock:
+        shared_bytes = sum(entry["nbytes"] for entry in _frames.values())
+        shared_count = len(_frames)
+    private = store.get("private_frames", {})
+    return {
+        "shared_frames": shared_count,
+        "shared_bytes": shared_bytes,
+        "private_frames": len(private),
+        "private_bytes": sum(entry["nbytes"] for entry in private.values()),
+        "private_budget_bytes": SESSION_BUDGET_BYTES
+    }
@@ -0,0 +1,79 @@
+import random
+import threading
+import time
+
+try:
+    import httpx
+    TRANSIENT_ERRORS = (ConnectionError, TimeoutError, httpx.TransportError)
+except ImportError:
+    TRANSIENT_ERRORS = (ConnectionError, TimeoutError)
+
+
+# Gateway statuses and PostgREST "database unreachable" codes, as carried on postgrest.APIError.code
+TRANSIENT_CODES = {"502", "503", "504", "PGRST000", "PGRST001", "PGRST002", "PGRST003"}
+
+# 🔁 Retry policy for transient upstream errors
+MAX_ATTEMPTS = 3
+BASE_DELAY = 0.2
+
+_lock = threading.Lock()
+_calls = {}
+
+
+class _Call:
+    def __init__(self):
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+def is_transient(error):
+    """True for connection problems and brief upstream 502/503/504 responses."""
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    return str(getattr(error, "code", "")) in TRANSIENT_CODES
+
+
+def with_retry(fn, *args):
+    """
+    Calls fn, retrying transient errors with full-jitter exponential backoff so
+    that many callers recovering from the same hiccup do not retry in lockstep.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return fn(*args)
+        except Exception as e:
+            if not is_transient(e) or attempt == MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(random.uniform(0, BASE_DELAY * 2 ** attempt))
+
+
+def do(key, fn, *args):
+    """
+    Runs fn(*args) once per key at a time. Callers that arrive while an
+    identical call is in flight wait for it and share its result (or error).
+    Shared results must be treated as read-only.
+    """
+    with _lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _Call()
+            _calls[key] = call
+
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = with_retry(fn, *args)
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _lock:
+            del _calls[key]
+        call.done.set()
@@ -0,0 +1,143 @@
+"""
+Cold-start benchmark for the Streamlit pages.
+
+Each page is measured in fresh interpreters so nothing is already imported:
+  - import time: the page's top-level import statements only
+  - first render: one full script run through streamlit's AppTest harness
+
+Heavy modules that a page pulls in at import time are listed, and the run
+fails (exit code 1) when a page exceeds its budget, raises while rendering or
+imports a heavy module it is not allowed to, so regressions are caught and a
+page that crashes early cannot pass as fast.
+
+    python startup_benchmark.py [--runs 3] [--skip-render] [--json]
+"""
+import argparse
+import ast
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent
+PAGES = [ROOT / "Homepage_supa.py"] + sorted((ROOT / "pages").glob("*.py"))
+
+# ⏱️ Budgets in seconds (median of the runs)
+IMPORT_BUDGET = 1.5
+RENDER_BUDGET = 5.0
+
+# Modules that should only load when a view that needs them runs
+HEAVY_MODULES = ("pandas", "matplotlib", "seaborn", "pyarrow")
+# Pages whose every view needs one of them may load it up front
+ALLOWED_HEAVY = {"05_Invoices_supa.py": ("pandas",)}
+
+IMPORT_PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+exec({code!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+RENDER_PROBE = """
+import json, time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+app = AppTest.from_file({path!r}, default_timeout={timeout})
+app.run()
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "errors": [str(e.value) for e in app.exception]}}))
+"""
+
+
+def page_imports(path):
+    """Source of the page's top-level import statements."""
+    source = path.read_text()
+    tree = ast.parse(source)
+    return "\n".join(ast.get_source_segment(source, node) for node in tree.body
+                     if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def _probe(code):
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure_imports(path, runs):
+    code = IMPORT_PROBE.format(root=str(ROOT), code=page_imports(path), heavy=HEAVY_MODULES)
+    samples = [_probe(code) for _ in range(runs)]
+    errors = [s["error"] for s in samples if "error" in s]
+    if errors:
+        return {"error": errors[0]}
+    return {"seconds": statistics.median(s["seconds"] for s in samples), "heavy": samples[0]["heavy"]}
+
+
+def measure_render(path, runs):
+    code = RENDER_PROBE.format(path=str(path), timeout=RENDER_BUDGET * 4)
+    samples = [_probe(code) for _ in range(runs)]
+    errors = [s["error"] for s in samples if "error" in s]
+    if errors:
+        return {"error": errors[0]}
+    return {"seconds": statistics.median(s["seconds"] for s in samples), "errors": samples[0]["errors"]}
+
+
+def unexpected_heavy(page, imports):
+    return [m for m in imports.get("heavy", []) if m not in ALLOWED_HEAVY.get(page, ())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per measurement")
+    parser.add_argument("--skip-render", action="store_true", help="only measure import time")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    failed = False
+    for path in PAGES:
+        result = {"page": path.name, "imports": measure_imports(path, args.runs)}
+        if not args.skip_render:
+            result["render"] = measure_render(path, args.runs)
+        for stage, budget in (("imports", IMPORT_BUDGET), ("render", RENDER_BUDGET)):
+            stats = result.get(stage)
+            if stats and ("error" in stats or stats["seconds"] > budget):
+                failed = True
+        if result.get("render", {}).get("errors") or unexpected_heavy(path.name, result["imports"]):
+            failed = True
+        results.append(result)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            imports = result["imports"]
+            line = f"{result['page']:<26}"
+            if "error" in imports:
+                line += f" imports: ERROR {imports['error']}"
+            else:
+                line += f" imports: {imports['seconds'] * 1000:7.0f} ms"
+                if imports["heavy"]:
+                    line += f" (loads {', '.join(imports['heavy'])})"
+                unexpected = unexpected_heavy(result["page"], imports)
+                if unexpected:
+                    line += f" NOT ALLOWED: {', '.join(unexpected)}"
+            render = result.get("render")
+            if render:
+                if "error" in render:
+                    line += f" | render: ERROR {render['error']}"
+                else:
+                    line += f" | render: {render['seconds'] * 1000:7.0f} ms"
+                    if render["errors"]:
+                        line += f" ({len(render['errors'])} exception(s): {render['errors'][0]})"
+            print(line)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
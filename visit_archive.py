@@ -0,0 +1,175 @@
+import glob
+import os
+from datetime import date, timedelta
+
+
+# 🧊 Cold-storage settings for visits older than the archive horizon
+ARCHIVE_DIR = os.getenv("VISIT_ARCHIVE_DIR", os.path.join("Data", "archive", "visits"))
+ARCHIVE_HORIZON_DAYS = int(os.getenv("VISIT_ARCHIVE_HORIZON_DAYS", "730"))
+PAGE_SIZE = 1000
+
+
+def archive_cutoff():
+    """Visits dated before this day live in the archive, not the database."""
+    return date.today() - timedelta(days=ARCHIVE_HORIZON_DAYS)
+
+
+def _month_path(month_start):
+    return os.path.join(ARCHIVE_DIR, f"visits_{month_start:%Y_%m}.parquet")
+
+
+def _month_of(path):
+    stamp = os.path.basename(path)[len("visits_"):-len(".parquet")]
+    year, month = stamp.split("_")
+    return date(int(year), int(month), 1)
+
+
+def _next_month(month_start):
+    return (month_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _fetch_month(client, month_start, month_end):
+    rows = []
+    offset = 0
+    while True:
+        page = client.table("visits") \
+            .select("*") \
+            .gte("visit_date", str(month_start)) \
+            .lt("visit_date", str(month_end)) \
+            .order("visit_id") \
+            .range(offset, offset + PAGE_SIZE - 1) \
+            .execute().data
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        offset += PAGE_SIZE
+
+
+def archive_old_visits(client, cutoff=None):
+    """
+    Moves visits dated before the cutoff into one zstd-compressed Parquet file
+    per month. Each month's file is published before its rows are deleted, so a
+    crash in between never loses visits; the next run re-archives the same rows
+    (merged by visit_id) and repeats the delete. Returns the number of visits archived.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    cutoff = cutoff or archive_cutoff()
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    # Left by a run that stopped before publishing; nothing was deleted for them
+    for leftover in glob.glob(os.path.join(ARCHIVE_DIR, "visits_*.parquet.tmp")):
+        os.remove(leftover)
+
+    oldest = client.table("visits").select("visit_date").order("visit_date").limit(1).execute().data
+    if not oldest:
+        return 0
+
+    archived = 0
+    month_start = date.fromisoformat(oldest[0]["visit_date"]).replace(day=1)
+    while month_start < cutoff:
+        month_end = min(_next_month(month_start), cutoff)
+        rows = _fetch_month(client, month_start, month_end)
+        if rows:
+            frame = pd.DataFrame(rows)
+            frame["visit_date"] = pd.to_datetime(frame["visit_date"]).dt.date
+            path = _month_path(month_start)
+            if os.path.exists(path):
+                existing = pq.read_table(path).to_pandas()
+                frame = pd.concat([existing, frame]).drop_duplicates("visit_id", keep="last")
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            pq.write_table(table, path + ".tmp", compression="zstd")
+            os.replace(path + ".tmp", path)
+
+            # Only the rows just published are deleted, so a visit backdated into this month
+            # meanwhile stays live until the next run. Until the delete commits, a visit can
+            # be both live and archived; readers let the live row win. archive_delete_visits()
+            # leaves the per-patient and per-doctor counters as they are.
+            client.rpc("archive_delete_visits", {
+                "p_ids": [row["visit_id"] for row in rows],
+                "p_from": str(month_start),
+                "p_to": str(month_end)
+            }).execute()
+            archived += len(rows)
+        month_start = _next_month(month_start)
+    return archived
+
+
+def read_archive(columns, start=None, end=None):
+    """
+    Reads archived visits through memory-mapped Parquet files, opening only the
+    months that overlap [start, end] and only the requested columns.
+    """
+    import pandas as pd
+    columns = list(dict.fromkeys(list(columns) + ["visit_date"]))
+    paths = sorted(glob.glob(os.path.join(ARCHIVE_DIR, "visits_*.parquet")))
+    if not paths:
+        return pd.DataFrame(columns=columns)
+
+    # pyarrow is only loaded once there is an archive to read
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tables = []
+    for path in paths:
+        month_start = _month_of(path)
+        if start and _next_month(month_start) <= start:
+            continue
+        if end and month_start > end:
+            continue
+        tables.append(pq.read_table(path, columns=columns, memory_map=True))
+
+    if not tables:
+        return pd.DataFrame(columns=columns)
+
+    frame = pa.concat_tables(tables).to_pandas()
+    if start:
+        frame = frame[frame["visit_date"] >= start]
+    if end:
+        frame = frame[frame["visit_date"] <= end]
+    return frame
+
+
+def read_patient_visits(patient_id, columns, through_month=None, min_rows=1):
+    """
+    Reads one patient's archived visits newest month first, starting at
+    through_month, and stops once at least min_rows are found. The patient
+    filter is applied while reading each file. Returns the rows newest first
+    and the month to continue from, or None once the archive is exhausted.
+    """
+    import pandas as pd
+    columns = list(dict.fromkeys(list(columns) + ["patient_id", "visit_id", "visit_date"]))
+    months = sorted(((_month_of(path), path) for path in glob.glob(os.path.join(ARCHIVE_DIR, "visits_*.parquet"))),
+                    reverse=True)
+    if through_month:
+        months = [(month, path) for month, path in months if month <= through_month]
+    if not months:
+        return pd.DataFrame(columns=columns), None
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tables = []
+    found = 0
+    next_month = None
+    for index, (month, path) in enumerate(months):
+        table = pq.read_table(path, columns=columns, filters=[("patient_id", "=", patient_id)], memory_map=True)
+        tables.append(table)
+        found += table.num_rows
+        if found >= min_rows:
+            next_month = months[index + 1][0] if index + 1 < len(months) else None
+            break
+
+    frame = pa.concat_tables(tables).to_pandas()
+    return frame.sort_values(["visit_date", "visit_id"], ascending=False, ignore_index=True), next_month
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    load_dotenv()
+    client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+    count = archive_old_visits(client)
+    print(f"Archived {count} visits dated before {archive_cutoff()} to {ARCHIVE_DIR}")
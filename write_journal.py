@@ -0,0 +1,201 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from single_flight import is_transient
+
+
+# 📒 Local write journal settings (enable with WRITE_JOURNAL=1)
+JOURNAL_PATH = os.getenv("WRITE_JOURNAL_PATH", "write_journal.db")
+SYNC_INTERVAL = 2
+BATCH_SIZE = 200
+
+# Unique index used to skip replayed inserts (visits are partitioned by visit_date)
+CONFLICT_TARGETS = {"visits": "idempotency_key,visit_date"}
+
+_init_lock = threading.Lock()
+_initialized = False
+_syncer = None
+
+
+def enabled():
+    return os.getenv("WRITE_JOURNAL", "").lower() in ("1", "true", "yes")
+
+
+def _connect():
+    global _initialized
+    conn = sqlite3.connect(JOURNAL_PATH, timeout=10)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA synchronous=FULL")
+    with _init_lock:
+        if not _initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS journal (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    idempotency_key TEXT NOT NULL UNIQUE,
+                    table_name TEXT NOT NULL,
+                    operation TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    match_column TEXT,
+                    match_value TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    error TEXT,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_journal_status ON journal (status, id)")
+            conn.commit()
+            _initialized = True
+    return conn
+
+
+def _append(client, table, operation, payload, match_column=None, match_value=None):
+    key = payload.get("idempotency_key") or str(uuid.uuid4())
+    with closing(_connect()) as conn:
+        conn.execute(
+            "INSERT INTO journal (idempotency_key, table_name, operation, payload, match_column, match_value, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, table, operation, json.dumps(payload, default=str), match_column,
+             None if match_value is None else str(match_value), time.time())
+        )
+        conn.commit()
+    start_syncer(client)
+    return key
+
+
+# ✍️ Durably record a write and return immediately; the syncer applies it later
+def record_insert(client, table, row):
+    row = dict(row, idempotency_key=str(uuid.uuid4()))
+    return _append(client, table, "insert", row)
+
+
+def record_update(client, table, values, match_column, match_value):
+    return _append(client, table, "update", dict(values), match_column, match_value)
+
+
+# 📊 Journal health for display in the UI
+def status():
+    with closing(_connect()) as conn:
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM journal GROUP BY status").fetchall())
+    return {"pending": counts.get("pending", 0), "conflict": counts.get("conflict", 0)}
+
+
+# 📒 Sidebar summary for the pages that write; also resumes syncing entries left
+# pending by an earlier process, without waiting for a new write
+def show_status_sidebar(client):
+    import streamlit as st
+
+    start_syncer(client)
+    journal = status()
+    st.sidebar.caption(f"Pending sync: {journal['pending']} | Conflicts: {journal['conflict']}")
+    if journal["conflict"]:
+        with st.sidebar.expander("Sync Conflicts"):
+            for entry in conflicts():
+                st.write(f"**{entry['operation']} {entry['table_name']}**: {entry['error']}")
+
+
+def conflicts(limit=50):
+    with closing(_connect()) as conn:
+        rows = conn.execute(
+            "SELECT id, table_name, operation, payload, error, created_at FROM journal "
+            "WHERE status = 'conflict' ORDER BY id DESC LIMIT ?", (limit,)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def _mark(conn, outcomes):
+    conn.executemany("UPDATE journal SET status = ?, error = ? WHERE id = ?", outcomes)
+    conn.commit()
+
+
+def _apply_inserts(client, table, entries):
+    """
+    Upserts a run of inserts in one request. Rows already applied are skipped
+    through their idempotency key; if the batch is rejected, rows are retried
+    one by one so a single conflict does not hold back the rest.
+    """
+    rows = [json.loads(entry["payload"]) for entry in entries]
+    on_conflict = CONFLICT_TARGETS.get(table, "idempotency_key")
+    try:
+        client.table(table).upsert(rows, on_conflict=on_conflict, ignore_duplicates=True).execute()
+        return [("synced", None, entry["id"]) for entry in entries]
+    except Exception as e:
+        if is_transient(e):
+            raise
+
+    outcomes = []
+    for entry, row in zip(entries, rows):
+        try:
+            client.table(table).upsert(row, on_conflict=on_conflict, ignore_duplicates=True).execute()
+            outcomes.append(("synced", None, entry["id"]))
+        except Exception as e:
+            if is_transient(e):
+                raise
+            outcomes.append(("conflict", str(e), entry["id"]))
+    return outcomes
+
+
+def _apply_update(client, entry):
+    try:
+        result = client.table(entry["table_name"]) \
+            .update(json.loads(entry["payload"])) \
+            .eq(entry["match_column"], entry["match_value"]) \
+            .execute()
+    except Exception as e:
+        if is_transient(e):
+            raise
+        return ("conflict", str(e), entry["id"])
+    if not result.data:
+        return ("conflict", "No matching row to update.", entry["id"])
+    return ("synced", None, entry["id"])
+
+
+def sync_once(client):
+    """
+    Applies up to BATCH_SIZE pending writes in journal order, batching runs of
+    inserts into the same table. Returns the number of entries processed.
+    """
+    with closing(_connect()) as conn:
+        entries = conn.execute(
+            "SELECT id, table_name, operation, payload, match_column, match_value FROM journal "
+            "WHERE status = 'pending' ORDER BY id LIMIT ?", (BATCH_SIZE,)
+        ).fetchall()
+
+        processed = 0
+        run = []
+        for entry in entries + [None]:
+            if run and (entry is None or entry["operation"] != "insert" or entry["table_name"] != run[0]["table_name"]):
+                _mark(conn, _apply_inserts(client, run[0]["table_name"], run))
+                processed += len(run)
+                run = []
+            if entry is None:
+                break
+            if entry["operation"] == "insert":
+                run.append(entry)
+            else:
+                _mark(conn, [_apply_update(client, entry)])
+                processed += 1
+    return processed
+
+
+def _run(client):
+    while True:
+        try:
+            while sync_once(client):
+                pass
+        except Exception:
+            # Connectivity problems leave entries pending for the next round
+            pass
+        time.sleep(SYNC_INTERVAL)
+
+
+def start_syncer(client):
+    global _syncer
+    with _init_lock:
+        if _syncer is None:
+            _syncer = threading.Thread(target=_run, args=(client,), name="write-journal-syncer", daemon=True)
+            _syncer.start()